@@ -0,0 +1,156 @@
+# Assignment.py
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def sample_pairs(rng, n, trips):
+    """Draw trips uniform (start, end) node-id pairs with start != end."""
+    starts = rng.integers(n, size=trips)
+    ends = rng.integers(n - 1, size=trips)
+    ends += ends >= starts
+    return starts, ends
+
+
+def assign_pairs(starts, ends, n, offsets, edge_ids, edge_count):
+    """Edge loads of routing every (start, end) pair over the path table (offsets, edge_ids)."""
+    # Count trips per pair, then spread each pair's count over the edges of its path.
+    pair_counts = np.bincount(starts * n + ends, minlength=n * n)
+    loads = np.bincount(edge_ids, weights=np.repeat(pair_counts, np.diff(offsets)), minlength=edge_count)
+    return loads.astype(np.int64)
+
+
+def pair_trip_counts(starts, ends, n):
+    """Sparse trips per ordered pair of a batch: (pair keys start * n + end, trip counts)."""
+    return np.unique(np.asarray(starts, dtype=np.int64) * n + ends, return_counts=True)
+
+
+def _ranges(starts, lengths):
+    """Concatenation of arange(start, start + length) over all (start, length)."""
+    ends = np.cumsum(lengths)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + lengths, lengths)
+
+
+def improved_pairs(distances, x, y, weight):
+    """Ordered pairs a new edge of the given weight between node ids x and y makes shorter.
+
+    A pair moves onto the edge exactly when d(s, x) + weight + d(y, t), or the same through
+    y -> x, beats d(s, t) in the n x n distances before the edge. Returns (pair keys s * n + t,
+    head pair keys of the s-x (or s-y) part, tail pair keys of the y-t (or x-t) part, updated
+    distances). Neither part can itself use the new edge.
+    """
+    n = len(distances)
+    via_xy = distances[:, x, None] + weight + distances[None, y, :]
+    via_yx = distances[:, y, None] + weight + distances[None, x, :]
+    forward = via_xy <= via_yx
+    via = np.where(forward, via_xy, via_yx)
+    improved = via < distances
+    distances = np.where(improved, via, distances)
+
+    pairs = np.flatnonzero(improved)
+    starts, ends = np.divmod(pairs, n)
+    forward = forward.reshape(-1)[pairs]
+    heads = starts * n + np.where(forward, x, y)
+    tails = np.where(forward, y, x) * n + ends
+    return pairs, heads, tails, distances
+
+
+def reassign_new_edge(distances, offsets, edge_ids, pair_trips, x, y, eid, weight, edge_count):
+    """Incremental all-or-nothing update after edge id eid between node ids x and y was added.
+
+    distances (n x n), the path table (offsets, edge_ids) and pair_trips (n x n trips routed
+    per ordered pair) describe the graph before the edge. Pairs from improved_pairs take the
+    old head path, the edge and the old tail path. Returns (load change per edge id, updated
+    distances, updated path table, number of rerouted pairs).
+    """
+    pairs, heads, tails, distances = improved_pairs(distances, x, y, weight)
+    improved = np.zeros(len(offsets) - 1, dtype=bool)
+    improved[pairs] = True
+    trips = np.asarray(pair_trips, dtype=np.float64).reshape(-1)[pairs]
+    lengths = np.diff(offsets)
+
+    delta = np.zeros(edge_count, dtype=np.float64)
+    for segments, sign in ((pairs, -1.0), (heads, 1.0), (tails, 1.0)):
+        positions = _ranges(offsets[segments], lengths[segments])
+        delta += sign * np.bincount(edge_ids[positions], weights=np.repeat(trips, lengths[segments]),
+                                    minlength=edge_count)
+    delta[eid] += trips.sum()
+
+    # Rebuild the path table: unchanged pairs copy their path, rerouted ones splice head + edge + tail.
+    new_lengths = lengths.copy()
+    new_lengths[pairs] = lengths[heads] + 1 + lengths[tails]
+    new_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(new_lengths, out=new_offsets[1:])
+    new_edge_ids = np.empty(new_offsets[-1], dtype=np.int64)
+    kept = np.flatnonzero(~improved)
+    new_edge_ids[_ranges(new_offsets[kept], lengths[kept])] = edge_ids[_ranges(offsets[kept], lengths[kept])]
+    new_edge_ids[_ranges(new_offsets[pairs], lengths[heads])] = edge_ids[_ranges(offsets[heads], lengths[heads])]
+    new_edge_ids[new_offsets[pairs] + lengths[heads]] = eid
+    new_edge_ids[_ranges(new_offsets[pairs] + lengths[heads] + 1, lengths[tails])] = \
+        edge_ids[_ranges(offsets[tails], lengths[tails])]
+    return delta, distances, (new_offsets, new_edge_ids), len(pairs)
+
+
+def tree_loads(tree, edge_count, weights=None):
+    """Edge loads of one trip from the tree's source to every node it reaches.
+
+    Walking the settling order backwards, each node passes everything routed below it on
+    to its predecessor edge, so the loads equal routing each pair along the tree's path.
+    With per-node ``weights``, each target receives that many trips instead of one and the
+    loads are floats.
+    """
+    _, pred, pred_edge, order = tree
+    below = [1] * len(pred) if weights is None else np.asarray(weights, dtype=np.float64).tolist()
+    dtype = np.int64 if weights is None else np.float64
+    loads = np.zeros(edge_count, dtype=dtype)
+    for node in reversed(order[1:]):
+        below[pred[node]] += below[node]
+    reached = np.asarray(order[1:], dtype=np.int64)
+    # Every reached node has its own predecessor edge, so no edge is written twice.
+    loads[np.asarray(pred_edge, dtype=np.int64)[reached]] = np.asarray(below, dtype=dtype)[reached]
+    return loads
+
+
+_shard = {}
+
+
+def _init_shard_worker(n, offsets, edge_ids, edge_count, demand=None):
+    """Receive the shared path table and demand once per worker process."""
+    _shard.update(n=n, offsets=offsets, edge_ids=edge_ids, edge_count=edge_count, demand=demand)
+
+
+def _route_shard_chunk(trips, seed, track_pairs=False):
+    rng = np.random.default_rng(seed)
+    if _shard['demand'] is None:
+        starts, ends = sample_pairs(rng, _shard['n'], trips)
+    else:
+        starts, ends = _shard['demand'].sample(rng, trips)
+    loads = assign_pairs(starts, ends, _shard['n'], _shard['offsets'], _shard['edge_ids'], _shard['edge_count'])
+    pairs = pair_trip_counts(starts, ends, _shard['n']) if track_pairs else None
+    return loads, (int(starts[-1]), int(ends[-1])), pairs
+
+
+def run_sharded(n, offsets, edge_ids, edge_count, chunk_trips, seed=None, workers=None, first_chunk=0,
+                demand=None, track_pairs=False):
+    """Route chunks of trips on a process pool, yielding (chunk, loads, last_pair, pairs) in chunk order.
+
+    pairs is the chunk's pair_trip_counts when track_pairs is set, None otherwise.
+
+    Every chunk draws from its own child of ``np.random.SeedSequence(seed)``, so the merged
+    counts depend only on the seed and the chunk layout, never on scheduling. Chunks before
+    ``first_chunk`` are skipped, which resumes an interrupted run with the same streams.
+    Trips follow the bound ``demand`` model when given, uniform pairs otherwise.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_trips))
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_shard_worker,
+                             initargs=(n, offsets, edge_ids, edge_count, demand)) as pool:
+        futures = [pool.submit(_route_shard_chunk, trips, child, track_pairs)
+                   for trips, child in zip(chunk_trips[first_chunk:], seeds[first_chunk:])]
+        try:
+            for chunk, future in enumerate(futures, start=first_chunk):
+                loads, last_pair, pairs = future.result()
+                yield chunk, loads, last_pair, pairs
+        finally:
+            pool.shutdown(cancel_futures=True)
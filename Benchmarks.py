@@ -0,0 +1,204 @@
+# Benchmarks.py
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from LargerNetwork import initialize_graph
+from SimulationLogic import TrafficSimulation
+
+# All-pairs structures (path table, distance matrix) are only benchmarked up to this size.
+ALL_PAIRS_LIMIT = 2000
+
+
+def measure(setup):
+    """Time the callable returned by setup(), then rerun a fresh one under tracemalloc.
+
+    Returns (result of the timed run, seconds, peak traced bytes). Tracing slows Python
+    allocation heavily, so the timed run is never traced.
+    """
+    function = setup()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+
+    function = setup()
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def build_case(nodes, k, seed):
+    """Seeded Watts-Strogatz network with random weights and non-adjacent candidate roads."""
+    random.seed(seed)
+    graph, _ = initialize_graph(nodes=nodes, k=k, candidate_limit=0)
+    rng = random.Random(seed)
+    for u, v in graph.edges():
+        graph[u][v]['weight'] = rng.randint(1, 10)
+    candidates = set()
+    while len(candidates) < min(200, nodes * (nodes - 1) // 4):
+        u, v = rng.sample(range(nodes), 2)
+        if not graph.has_edge(u, v):
+            candidates.add((min(u, v), max(u, v)))
+    return graph, sorted(candidates)
+
+
+def drain(simulation):
+    """Route the simulation's agents without writing any result files."""
+    random.seed(simulation.seed)
+    if simulation.mode == 'agents':
+        simulation._simulate_agents()
+    else:
+        for _ in simulation._simulate_batched():
+            pass
+    return simulation
+
+
+def bench_simulation(graph, mode, iterations, agent_count, seed):
+    def setup():
+        simulation = TrafficSimulation(graph, [], iterations=iterations, agent_count=agent_count, mode=mode,
+                                       seed=seed, batch_size=max(1, iterations // 10))
+        return lambda: drain(simulation)
+
+    simulation, seconds, peak = measure(setup)
+    return {'case': f'simulate_traffic[{mode}]', 'agent_count': agent_count, 'iterations': iterations,
+            'agents': iterations * agent_count, 'seconds': seconds,
+            'agents_per_second': iterations * agent_count / seconds, 'peak_bytes': peak,
+            'cache_misses': simulation.path_cache.misses}
+
+
+def bench_shortest_path(graph, queries, seed):
+    rng = random.Random(seed)
+    nodes = list(graph.nodes())
+    pairs = [rng.sample(nodes, 2) for _ in range(queries)]
+
+    def setup():
+        simulation = TrafficSimulation(graph, [])
+
+        def query():
+            for u, v in pairs:
+                simulation.calculate_shortest_path(u, v)
+            return simulation
+        return query
+
+    simulation, seconds, peak = measure(setup)
+    return {'case': 'calculate_shortest_path', 'queries': queries, 'seconds': seconds,
+            'queries_per_second': queries / seconds, 'peak_bytes': peak,
+            'cache_hits': simulation.path_cache.hits, 'cache_misses': simulation.path_cache.misses}
+
+
+def bench_benefit(graph, candidates, seed, bulk):
+    # Without all-pairs structures, load the network with a few agents and score one by one.
+    mode, agent_count = ('batched', 1000) if bulk else ('agents', 100)
+    loaded = drain(TrafficSimulation(graph, candidates, iterations=1, agent_count=agent_count, mode=mode,
+                                     seed=seed))
+    if not bulk:
+        candidates = candidates[:50]
+
+    def fresh():
+        """Copy of the loaded simulation with cold shortest-path and distance caches."""
+        simulation = TrafficSimulation(graph, candidates, mode=mode, seed=seed)
+        simulation.nt.array[:] = loaded.nt.array
+        return simulation
+
+    def score_setup():
+        simulation = fresh()
+        if bulk:
+            return lambda: simulation.score_roads(candidates)
+        return lambda: [simulation.benefit(*road) for road in candidates]
+
+    _, seconds, peak = measure(score_setup)
+    results = [{'case': 'score_roads' if bulk else 'benefit', 'candidates': len(candidates), 'seconds': seconds,
+                'candidates_per_second': len(candidates) / seconds, 'peak_bytes': peak}]
+    if bulk:
+        def select_setup():
+            simulation = fresh()
+            return lambda: simulation.evaluate_and_update_road_benefits(k=1)
+
+        _, seconds, peak = measure(select_setup)
+        results.append({'case': 'evaluate_and_update_road_benefits', 'candidates': len(candidates),
+                        'seconds': seconds, 'peak_bytes': peak})
+    return results
+
+
+def run_suite(sizes, agent_counts, iterations, k, seed):
+    results = []
+    for nodes in sizes:
+        graph, candidates = build_case(nodes, k, seed)
+        all_pairs = nodes <= ALL_PAIRS_LIMIT
+        case = {'nodes': nodes, 'edges': graph.number_of_edges()}
+        print(f"Benchmarking {nodes} nodes / {graph.number_of_edges()} edges")
+
+        for agent_count in agent_counts:
+            if all_pairs:
+                results.append({**case, **bench_simulation(graph, 'batched', iterations, agent_count, seed)})
+            # Agent-by-agent routing is slow, so it always runs a fixed small number of trips.
+            results.append({**case, **bench_simulation(graph, 'agents', max(1, 2000 // agent_count),
+                                                       agent_count, seed)})
+        results.append({**case, **bench_shortest_path(graph, 2000, seed)})
+        results.extend({**case, **result} for result in bench_benefit(graph, candidates, seed, bulk=all_pairs))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path, current_path):
+    """Print the throughput ratio of every case present in both result files."""
+    def keyed(path):
+        with open(path) as f:
+            return {(r['case'], r['nodes'], r.get('agent_count'), r.get('iterations')): r
+                    for r in json.load(f)['results']}
+
+    baseline, current = keyed(baseline_path), keyed(current_path)
+    for key in sorted(set(baseline) & set(current), key=str):
+        ratio = baseline[key]['seconds'] / current[key]['seconds']
+        agents = f"agents={key[2]}" if key[2] is not None else ""
+        print(f"{key[0]:40s} nodes={key[1]:<6d} {agents:12s} speedup x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation and benefit hot paths.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[60, 1000, 10000])
+    parser.add_argument('--agents', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run_suite(args.sizes, args.agents, args.iterations, args.k, args.seed)
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'settings': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved successfully to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# BenefitEngine.py
+import numpy as np
+
+from PathCache import ShortestPathCache
+
+
+class BenefitEngine:
+    """Scores candidate roads in bulk against one all-pairs distance matrix per graph version.
+
+    Uses the same formula as ``TrafficSimulation.benefit``: the direct saving on the road's
+    own traffic plus, for every neighbor pair (n1 of y, n2 of x), the saving of routing the
+    n1-n2 traffic over the new road whenever that is shorter.
+    """
+
+    def __init__(self, graph, path_cache=None, factor=0.6, max_pairs_per_chunk=1 << 20):
+        self.graph = graph
+        self.path_cache = path_cache if path_cache is not None else ShortestPathCache(graph)
+        self.factor = factor
+        self.max_pairs_per_chunk = max_pairs_per_chunk
+        self.costs = None
+        self._distances = None
+
+    def set_costs(self, costs):
+        """Measure distances with per-edge-id costs (e.g. congested travel times) instead of weights.
+
+        Roads added later than the costs were computed keep their own weight; None restores
+        the plain weights.
+        """
+        self.costs = None if costs is None else np.asarray(costs, dtype=np.float64)
+        self._distances = None
+
+    def set_distances(self, distances):
+        """Install a distance matrix known to match the graph's current version and costs."""
+        self._distances = (self.graph.version, distances)
+
+    def distance_matrix(self):
+        """All-pairs shortest path lengths by node id, computed once per graph version."""
+        if self._distances is None or self._distances[0] != self.graph.version:
+            n = self.graph.number_of_nodes()
+            distances = np.empty((n, n), dtype=np.float64)
+            if self.costs is None:
+                for source in range(n):
+                    distances[source] = np.frombuffer(self.path_cache.tree(source)[0], dtype=np.float64)
+            else:
+                costs = self.graph.weights.copy()
+                costs[:len(self.costs)] = self.costs
+                for source in range(n):
+                    distances[source] = self.graph.shortest_path_tree(source, weights=costs)[0]
+            self._distances = (self.graph.version, distances)
+        return self._distances[1]
+
+    def traffic_matrix(self, counts):
+        """Dense symmetric matrix of the traffic count on the road between each node pair."""
+        n = self.graph.number_of_nodes()
+        m = self.graph.number_of_edges()
+        traffic = np.zeros((n, n), dtype=np.float64)
+        traffic[self.graph.edge_u, self.graph.edge_v] = counts[:m]
+        traffic[self.graph.edge_v, self.graph.edge_u] = counts[:m]
+        return traffic
+
+    def score(self, roads, counts, traffic=None):
+        """Benefit of every road in roads (label pairs) given per-edge-id traffic counts.
+
+        ``traffic`` may pass a traffic_matrix(counts) already built for repeated calls.
+        """
+        return self._evaluate(roads, counts, traffic, with_bounds=False)[0]
+
+    def score_with_bounds(self, roads, counts, traffic=None):
+        """Benefits plus upper bounds that stay valid after any further roads are added.
+
+        Adding roads only shortens distances, and by the triangle inequality no neighbor
+        pair can save more than ``(1 - factor) * d(x, y)`` or its own current distance, so
+        each bound holds as long as nt and the neighbors of x and y stay unchanged.
+        """
+        return self._evaluate(roads, counts, traffic, with_bounds=True)
+
+    def _evaluate(self, roads, counts, traffic, with_bounds):
+        index = self.graph.index
+        xs = np.array([index[x] for x, _ in roads], dtype=np.int64)
+        ys = np.array([index[y] for _, y in roads], dtype=np.int64)
+        distances = self.distance_matrix()
+        if traffic is None:
+            traffic = self.traffic_matrix(np.asarray(counts))
+        indptr, indices = self.graph.indptr, self.graph.indices
+        degree = np.diff(indptr)
+
+        benefits = np.empty(len(roads), dtype=np.float64)
+        bounds = np.empty(len(roads), dtype=np.float64) if with_bounds else None
+        with np.errstate(invalid='ignore'):
+            current = distances[xs, ys]
+            proposed = current * self.factor
+            direct = (current - proposed) * traffic[xs, ys]
+
+            pair_counts = degree[ys] * degree[xs]
+            first = 0
+            while first < len(roads):
+                # Take as many candidates as fit the pair budget, but always at least one.
+                budget = np.cumsum(pair_counts[first:])
+                last = first + max(1, int(np.searchsorted(budget, self.max_pairs_per_chunk, side='right')))
+                chunk = slice(first, last)
+                candidate, n1, n2 = self._neighbor_pairs(xs[chunk], ys[chunk], indptr, indices, degree)
+                x = xs[chunk][candidate]
+                y = ys[chunk][candidate]
+                pair_traffic = traffic[n1, n2]
+                original = distances[n1, n2]
+
+                indirect_path_length = distances[x, n1] + proposed[chunk][candidate] + distances[y, n2]
+                gain = np.where((n1 != n2) & (indirect_path_length < original),
+                                (original - indirect_path_length) * pair_traffic, 0.0)
+                benefits[chunk] = direct[chunk] + np.bincount(candidate, weights=gain, minlength=last - first)
+
+                if with_bounds:
+                    saving = current[chunk] - proposed[chunk]
+                    limit = np.where((n1 != n2) & (pair_traffic > 0),
+                                     np.minimum(original, saving[candidate]) * pair_traffic, 0.0)
+                    bounds[chunk] = (np.where(traffic[xs[chunk], ys[chunk]] > 0, direct[chunk], 0.0)
+                                     + np.bincount(candidate, weights=limit, minlength=last - first))
+                    # Leave room for rounding differences against later exact scores.
+                    bounds[chunk] *= 1 + 1e-9
+                first = last
+        return benefits, bounds
+
+    @staticmethod
+    def _neighbor_pairs(xs, ys, indptr, indices, degree):
+        """(candidate, n1, n2) for every neighbor n1 of y and n2 of x of each candidate."""
+        pair_counts = degree[ys] * degree[xs]
+        candidate = np.repeat(np.arange(len(xs)), pair_counts)
+        local = np.arange(len(candidate)) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+        # n1 walks the neighbors of y in the outer position, n2 those of x in the inner one.
+        width = degree[xs][candidate]
+        n1 = indices[indptr[ys][candidate] + local // width]
+        n2 = indices[indptr[xs][candidate] + local % width]
+        return candidate, n1, n2
@@ -0,0 +1,118 @@
+# CandidateRoads.py
+from heapq import heappop, heappush, nlargest
+
+import numpy as np
+
+from CompactGraph import CompactGraph
+
+
+def node_loads(graph, counts):
+    """Traffic through every node: the summed counts of its incident roads."""
+    loads = np.zeros(graph.number_of_nodes(), dtype=np.float64)
+    m = graph.number_of_edges()
+    counts = np.asarray(counts, dtype=np.float64)[:m]
+    np.add.at(loads, graph.edge_u, counts)
+    np.add.at(loads, graph.edge_v, counts)
+    return loads
+
+
+def _ball(graph, source, max_hops):
+    """Hop distance of every node at most max_hops away from source (BFS)."""
+    indptr, indices, _, _ = graph.adjacency_lists()
+    hops = {source: 0}
+    frontier = [source]
+    for hop in range(1, max_hops + 1):
+        next_frontier = []
+        for u in frontier:
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                if v not in hops:
+                    hops[v] = hop
+                    next_frontier.append(v)
+        frontier = next_frontier
+    return hops
+
+
+def _ball_distances(graph, source, ball):
+    """Dijkstra from source restricted to the nodes of ball."""
+    indptr, indices, incident, weights = graph.adjacency_lists()
+    dist = {source: 0.0}
+    done = set()
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            if v in ball:
+                nd = d + weights[incident[k]]
+                if nd < dist.get(v, np.inf):
+                    dist[v] = nd
+                    heappush(heap, (nd, v))
+    return dist
+
+
+def _pair_order(u, v):
+    """Pseudo-random but fixed rank of the pair (u, v), so equal scores do not favor low node ids."""
+    return ((u * 0x9E3779B1) ^ (v * 0x85EBCA77)) * 0xC2B2AE3D & 0xFFFFFFFF
+
+
+def _scored_pairs(graph, counts, min_hops, max_hops, min_detour, per_node):
+    """Yield ((score, hops, order), u, v) for the candidate pairs of iter_candidate_roads, by node id."""
+    if graph.number_of_edges() == 0:
+        return
+    min_hops = max(min_hops, 2)
+    mean_weight = float(graph.weights.mean()) or 1.0
+    loads = None
+    if counts is not None:
+        loads = node_loads(graph, counts)
+        loads = 1.0 + loads / max(loads.mean(), 1.0)
+
+    for u in range(graph.number_of_nodes()):
+        ball = _ball(graph, u, max_hops)
+        dist = _ball_distances(graph, u, ball)
+        scored = []
+        for v, hops in ball.items():
+            # Each unordered pair is produced once, from its lower id.
+            if v <= u or hops < min_hops:
+                continue
+            detour = dist[v] / (hops * mean_weight)
+            if detour < min_detour:
+                continue
+            score = detour * (loads[u] + loads[v]) if loads is not None else detour
+            scored.append(((score, hops, _pair_order(u, v)), v))
+        if per_node is not None:
+            scored = nlargest(per_node, scored)
+        for key, v in scored:
+            yield key, u, v
+
+
+def iter_candidate_roads(graph, counts=None, min_hops=2, max_hops=3, min_detour=0.0, per_node=None):
+    """Stream ((u, v), score) for non-adjacent node pairs, never holding all pairs in memory.
+
+    Only pairs between ``min_hops`` and ``max_hops`` hops apart are considered. The score is
+    the detour ratio, the shortest path between u and v over its hop distance in typical
+    (mean-weight) roads, times the traffic through u and v when per-edge-id ``counts`` are
+    given. Distances are searched within the hop ball of u, which can only overestimate
+    them. Pairs below ``min_detour`` are pruned and ``per_node`` keeps only the best pairs
+    of each source node.
+    """
+    if not isinstance(graph, CompactGraph):
+        graph = CompactGraph.from_networkx(graph)
+    nodes = graph.nodes
+    for key, u, v in _scored_pairs(graph, counts, min_hops, max_hops, min_detour, per_node):
+        yield (nodes[u], nodes[v]), key[0]
+
+
+def top_candidate_roads(graph, counts=None, limit=100, min_hops=2, max_hops=3, min_detour=0.0, per_node=None):
+    """The limit best-scoring candidate roads, best first, in O(limit) memory.
+
+    Equal scores prefer pairs more hops apart, then a fixed pseudo-random pair order.
+    """
+    if not isinstance(graph, CompactGraph):
+        graph = CompactGraph.from_networkx(graph)
+    nodes = graph.nodes
+    ranked = nlargest(limit, _scored_pairs(graph, counts, min_hops, max_hops, min_detour, per_node))
+    return [(nodes[u], nodes[v]) for _, u, v in ranked]
@@ -0,0 +1,89 @@
+# Checkpoint.py
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Cannot store {type(value).__name__} in a checkpoint")
+
+
+def write_checkpoint(path, arrays, meta):
+    """Atomically write arrays plus a JSON metadata record as one .npz file.
+
+    The data goes to a temporary file that is synced and then renamed over path, so a crash
+    leaves either the previous checkpoint or the new one, never a partial file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, meta=np.array(json.dumps(meta, default=_json_default)), **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_checkpoint(path):
+    """Return (arrays, meta) of a checkpoint written by write_checkpoint."""
+    with np.load(path) as stored:
+        arrays = {name: stored[name] for name in stored.files if name != 'meta'}
+        meta = json.loads(str(stored['meta']))
+    return arrays, meta
+
+
+class CheckpointWriter:
+    """Writes checkpoints on a background thread so the simulation never waits on disk.
+
+    submit() hands over an already copied state and returns at once; if the thread is still
+    busy, a newer submission replaces the pending one. flush() waits for the last write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+        self.error = None
+        self._pending = None
+        self._busy = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, arrays, meta):
+        with self._condition:
+            self._pending = (arrays, meta)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                arrays, meta = self._pending
+                self._pending = None
+                self._busy = True
+            try:
+                write_checkpoint(self.path, arrays, meta)
+                self.written += 1
+            except Exception as e:
+                self.error = e
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+    def flush(self):
+        """Block until every submitted checkpoint is on disk; re-raise a failed write."""
+        with self._condition:
+            while self._pending is not None or self._busy:
+                self._condition.wait()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
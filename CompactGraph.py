@@ -0,0 +1,168 @@
+# CompactGraph.py
+from array import array
+from heapq import heappop, heappush
+
+import networkx as nx
+import numpy as np
+
+
+class CompactGraph:
+    """Array-backed undirected weighted graph used by the simulation hot paths.
+
+    Nodes are dense integer ids (``nodes[i]`` is the original label) and every road has a
+    canonical edge id indexing ``edge_u``, ``edge_v`` and ``weights``. Adjacency is kept in
+    CSR form: the neighbors of node ``i`` are ``indices[indptr[i]:indptr[i + 1]]`` and the
+    matching edge ids are at the same positions in ``incident``.
+    """
+
+    __slots__ = ('nodes', 'index', 'edge_u', 'edge_v', 'weights', 'indptr', 'indices', 'incident',
+                 'version', '_edge_ids', '_lists', '_nx')
+
+    def __init__(self, nodes=(), edges=(), weights=()):
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        self.edge_u = edges[:, 0].copy()
+        self.edge_v = edges[:, 1].copy()
+        self.weights = np.asarray(weights, dtype=np.float64).reshape(-1).copy()
+        if len(self.weights) != len(self.edge_u):
+            raise ValueError("Every edge needs exactly one weight.")
+        low = np.minimum(self.edge_u, self.edge_v).tolist()
+        high = np.maximum(self.edge_u, self.edge_v).tolist()
+        self._edge_ids = dict(zip(zip(low, high), range(len(low))))
+        self.version = 0
+        self._build_csr()
+
+    @classmethod
+    def from_networkx(cls, graph, weight='weight', default=1.0):
+        """Build a compact copy of a networkx graph, keeping its node and edge order."""
+        nodes = list(graph.nodes())
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = [(index[u], index[v]) for u, v in graph.edges()]
+        weights = [w if w is not None else default for _, _, w in graph.edges(data=weight, default=default)]
+        return cls(nodes, edges, weights)
+
+    def to_networkx(self, weight='weight'):
+        """Return (and cache until the next change) an equivalent networkx graph."""
+        if self._nx is None:
+            graph = nx.Graph()
+            graph.add_nodes_from(self.nodes)
+            nodes = self.nodes
+            graph.add_weighted_edges_from(
+                zip([nodes[u] for u in self.edge_u.tolist()], [nodes[v] for v in self.edge_v.tolist()],
+                    self.weights.tolist()), weight=weight)
+            self._nx = graph
+        return self._nx
+
+    def _build_csr(self):
+        n = len(self.nodes)
+        m = len(self.edge_u)
+        ends = np.concatenate([self.edge_u, self.edge_v])
+        order = np.argsort(ends, kind='stable')
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=n), out=self.indptr[1:])
+        self.indices = np.concatenate([self.edge_v, self.edge_u])[order]
+        self.incident = np.tile(np.arange(m, dtype=np.int64), 2)[order]
+        self._lists = None
+        self._nx = None
+
+    def copy(self):
+        """Independent copy with the same node order, edge ids and version."""
+        graph = CompactGraph.__new__(CompactGraph)
+        graph.nodes = list(self.nodes)
+        graph.index = dict(self.index)
+        graph._edge_ids = dict(self._edge_ids)
+        # Edges and adjacency are replaced rather than changed in place, except re-weighted weights.
+        graph.edge_u, graph.edge_v, graph.weights = self.edge_u, self.edge_v, self.weights.copy()
+        graph.indptr, graph.indices, graph.incident = self.indptr, self.indices, self.incident
+        graph.version = self.version
+        graph._lists = None
+        graph._nx = None
+        return graph
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.edge_u)
+
+    def edges(self):
+        """Edges as label tuples, in edge-id order."""
+        nodes = self.nodes
+        return [(nodes[u], nodes[v]) for u, v in zip(self.edge_u.tolist(), self.edge_v.tolist())]
+
+    def neighbors(self, i):
+        """Neighbor ids of node id i."""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def edge_id(self, u, v):
+        """Edge id of the road between node ids u and v, or None."""
+        return self._edge_ids.get((u, v) if u < v else (v, u))
+
+    def add_node(self, node):
+        """Return the id of node, adding it if it is new."""
+        i = self.index.get(node)
+        if i is None:
+            i = len(self.nodes)
+            self.nodes.append(node)
+            self.index[node] = i
+        return i
+
+    def add_edge(self, u, v, weight):
+        """Add (or re-weight) the road between labels u and v and return its edge id."""
+        ui, vi = self.add_node(u), self.add_node(v)
+        eid = self.edge_id(ui, vi)
+        if eid is None:
+            eid = len(self.edge_u)
+            self._edge_ids[(min(ui, vi), max(ui, vi))] = eid
+            self.edge_u = np.append(self.edge_u, ui)
+            self.edge_v = np.append(self.edge_v, vi)
+            self.weights = np.append(self.weights, float(weight))
+        else:
+            self.weights[eid] = weight
+        self._build_csr()
+        self.version += 1
+        return eid
+
+    def adjacency_lists(self):
+        """CSR arrays and weights as flat Python lists, which index fastest from pure Python."""
+        if self._lists is None:
+            self._lists = (self.indptr.tolist(), self.indices.tolist(), self.incident.tolist(),
+                           self.weights.tolist())
+        return self._lists
+
+    def shortest_path_tree(self, source, weights=None):
+        """Dijkstra from node id source.
+
+        Returns ``(dist, pred, pred_edge, order)``: distances (inf when unreachable), the
+        predecessor node and edge id of every reached node (-1 otherwise) and the reached
+        nodes in settling order. ``weights`` optionally overrides the edge weights.
+        """
+        indptr, indices, incident, edge_weights = self.adjacency_lists()
+        if weights is not None:
+            edge_weights = weights.tolist() if isinstance(weights, np.ndarray) else weights
+        n = len(self.nodes)
+        dist = [np.inf] * n
+        pred = [-1] * n
+        pred_edge = [-1] * n
+        done = [False] * n
+        order = []
+
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heappop(heap)
+            if done[u]:
+                continue
+            done[u] = True
+            order.append(u)
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + edge_weights[incident[k]]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred[v] = u
+                    pred_edge[v] = incident[k]
+                    heappush(heap, (nd, v))
+
+        return array('d', dist), array('q', pred), array('q', pred_edge), array('q', order)
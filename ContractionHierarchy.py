@@ -0,0 +1,462 @@
+# ContractionHierarchy.py
+import copy
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+
+# Largest number of arcs per road (or per node, if more) a hierarchy may grow to through fill-in.
+DEFAULT_MAX_FILL = 32
+# Largest number of lower triangles customization may keep, about 16 bytes each.
+DEFAULT_MAX_TRIANGLES = 10 ** 8
+
+
+class FillBudgetExceeded(ValueError):
+    """Raised when eliminating the graph would add more fill-in arcs than allowed."""
+
+
+def nested_dissection_order(graph, leaf_size=16):
+    """Contraction order of a CompactGraph's node ids by recursive BFS-level bisection.
+
+    Each part is split by the BFS level (from a pseudo-peripheral node) holding its median
+    node; the level's nodes touching the far side form the separator, which is contracted
+    after both halves. Road networks have small separators, which keeps the fill-in and
+    the upward search spaces small.
+    """
+    n = graph.number_of_nodes()
+    indptr, indices, _, _ = graph.adjacency_lists()
+    member = [-1] * n
+    order = []
+    stack = [('split', list(range(n)))]
+    token = 0
+    while stack:
+        action, nodes = stack.pop()
+        if action == 'emit' or len(nodes) <= leaf_size:
+            order.extend(nodes)
+            continue
+        token += 1
+        for v in nodes:
+            member[v] = token
+        levels = _bfs_levels(indptr, indices, member, token, nodes[0])
+        levels = _bfs_levels(indptr, indices, member, token, levels[-1][0])
+        reached = sum(len(level) for level in levels)
+        if reached < len(nodes):
+            # Disconnected part: its components need no separator.
+            seen = set(v for level in levels for v in level)
+            stack.append(('split', [v for v in nodes if v not in seen]))
+            stack.append(('split', [v for level in levels for v in level]))
+            continue
+        if len(levels) <= 2:
+            order.extend(nodes)
+            continue
+        middle, count = 0, len(levels[0])
+        while count < len(nodes) // 2:
+            middle += 1
+            count += len(levels[middle])
+        middle = min(max(middle, 1), len(levels) - 2)
+        far = set(levels[middle + 1])
+        separator = [v for v in levels[middle] if any(u in far for u in indices[indptr[v]:indptr[v + 1]])]
+        kept = set(separator)
+        near = [v for level in levels[:middle] for v in level] + [v for v in levels[middle] if v not in kept]
+        stack.append(('emit', separator))
+        stack.append(('split', [v for level in levels[middle + 1:] for v in level]))
+        stack.append(('split', near))
+    return order
+
+
+def _bfs_levels(indptr, indices, member, token, source):
+    """BFS levels from source over the nodes whose member entry equals token."""
+    levels = [[source]]
+    seen = {source}
+    while True:
+        frontier = []
+        for v in levels[-1]:
+            for u in indices[indptr[v]:indptr[v + 1]]:
+                if member[u] == token and u not in seen:
+                    seen.add(u)
+                    frontier.append(u)
+        if not frontier:
+            return levels
+        levels.append(frontier)
+
+
+def eliminate(graph, order, max_arcs=None):
+    """Upward neighbor sets of eliminating node ids in order, with fill-in.
+
+    Eliminating a node joins its remaining neighbors into a clique, so every returned
+    ``up[v]`` is a clique of the resulting chordal supergraph of the road network. Raises
+    FillBudgetExceeded as soon as the up sets hold more than max_arcs arcs.
+    """
+    n = graph.number_of_nodes()
+    indptr, indices, _, _ = graph.adjacency_lists()
+    adjacency = [set(indices[indptr[v]:indptr[v + 1]]) - {v} for v in range(n)]
+    up = [None] * n
+    arcs = 0
+    for v in order:
+        up[v] = adjacency[v]
+        arcs += len(up[v])
+        if max_arcs is not None and arcs > max_arcs:
+            raise FillBudgetExceeded(
+                f"Contracting the network needs more than {max_arcs} arcs; it is too far from a road network's "
+                f"small separators for a contraction hierarchy.")
+        for u in up[v]:
+            adjacency[u].discard(v)
+            adjacency[u] |= up[v]
+            adjacency[u].discard(u)
+    return up
+
+
+class ContractionHierarchy:
+    """Customizable contraction hierarchy over a CompactGraph, answering point-to-point queries.
+
+    Preprocessing orders the nodes by nested dissection and adds the fill-in arcs that make
+    the graph chordal; it depends on the road layout only. Customization then computes the
+    weight of every arc bottom-up over its lower triangles, one elimination-tree level at a
+    time in NumPy. A query walks the elimination-tree ancestors of both ends, which is the
+    whole upward search space, and unpacks the meeting arcs into road edge ids.
+
+    It targets near-planar road networks, whose small separators keep the fill-in to a
+    small multiple of the roads. Graphs with many long-range links (e.g. small-world
+    networks) fill in far more; preprocessing raises FillBudgetExceeded once the arcs
+    exceed ``max_fill`` per road or the triangles ``max_triangles``, instead of running out
+    of memory.
+
+    The hierarchy follows the graph's version: roads added to the graph are folded in on
+    the next query, by re-customizing only the ancestors of the new road when it fits the
+    existing arcs and by rebuilding the arc structure (keeping the order) otherwise.
+    """
+
+    def __init__(self, graph, order=None, max_searches=4096, max_fill=DEFAULT_MAX_FILL,
+                 max_triangles=DEFAULT_MAX_TRIANGLES):
+        self.graph = graph
+        # An explicit contraction order (node ids, first contracted first) skips nested dissection.
+        self.initial_order = order
+        self.max_searches = max_searches
+        self.max_fill = max_fill
+        self.max_triangles = max_triangles
+        self.hits = 0
+        self.misses = 0
+        self.recustomizations = 0
+        self.rebuilds = 0
+        self._searches = OrderedDict()
+        self.preprocess()
+
+    def preprocess(self):
+        """Order the nodes, build the chordal arc structure and customize it."""
+        order = self.initial_order if self.initial_order is not None else nested_dissection_order(self.graph)
+        self.order = list(order)
+        max_arcs = self.max_fill * max(self.graph.number_of_edges(), self.graph.number_of_nodes())
+        up = eliminate(self.graph, self.order, max_arcs if self.max_fill is not None else None)
+        triangles = sum(len(ups) * (len(ups) - 1) // 2 for ups in up)
+        if self.max_triangles is not None and triangles > self.max_triangles:
+            raise FillBudgetExceeded(
+                f"Customizing the hierarchy needs {triangles} triangles, more than the {self.max_triangles} allowed.")
+        self.rank = np.empty(len(self.order), dtype=np.int64)
+        self.rank[np.asarray(self.order, dtype=np.int64)] = np.arange(len(self.order))
+        self._up_sets = up
+        self._build_arcs()
+        self.customize()
+
+    def _build_arcs(self):
+        """Arc arrays, elimination tree and triangle lists of the current up sets."""
+        graph = self.graph
+        rank = self.rank.tolist()
+        n = len(rank)
+        self._up = [sorted(self._up_sets[v], key=rank.__getitem__) for v in range(n)]
+        low, high = [], []
+        for v, ups in enumerate(self._up):
+            low.extend([v] * len(ups))
+            high.extend(ups)
+        self.arc_low = np.asarray(low, dtype=np.int64)
+        self.arc_high = np.asarray(high, dtype=np.int64)
+        self._arc_index = dict(zip(zip(low, high), range(len(low))))
+        # The elimination-tree parent is a node's lowest ranked upward neighbor.
+        self.parent = [ups[0] if ups else -1 for ups in self._up]
+        arc_start = np.searchsorted(self.arc_low, np.arange(n + 1))
+        self._up_arc_ids = [np.arange(arc_start[v], arc_start[v + 1]) for v in range(n)]
+        self._up_nodes = [self.arc_high[arcs] for arcs in self._up_arc_ids]
+        # Scratch arrays of the upward searches, reset after every search.
+        self._dist = np.full(n, np.inf)
+        self._via = np.full(n, -1, dtype=np.int64)
+
+        # Every arc is a road or a shortcut; roads map to their edge id.
+        self.arc_edge = np.full(len(low), -1, dtype=np.int64)
+        self.base = np.full(len(low), np.inf)
+        for eid, (u, v, weight) in enumerate(zip(graph.edge_u.tolist(), graph.edge_v.tolist(),
+                                                 graph.weights.tolist())):
+            if u == v:
+                continue
+            arc = self._arc_index[(u, v) if rank[u] < rank[v] else (v, u)]
+            if weight < self.base[arc]:
+                self.base[arc] = weight
+                self.arc_edge[arc] = eid
+        self._edge_count = graph.number_of_edges()
+        self._weights = graph.weights.copy()
+
+        # Lower triangles (x, v, u): arcs x-v and x-u bound arc v-u. They are grouped by x and
+        # the groups are laid out by x's elimination-tree level, so customization relaxes one
+        # contiguous slice per level.
+        level = [0] * n
+        for v in self.order:
+            if self.parent[v] >= 0:
+                level[self.parent[v]] = max(level[self.parent[v]], level[v] + 1)
+        # Arcs are sorted by lower end, then by the rank of the upper end, so a pair's arc is
+        # found by binary search on this key.
+        arc_key = self.arc_low * n + self.rank[self.arc_high]
+        sizes = np.diff(arc_start)
+        dtype = np.int32 if len(low) < 2 ** 31 and n < 2 ** 31 else np.int64
+        self.triangles = tuple(np.empty(int((sizes * (sizes - 1) // 2).sum()), dtype=dtype) for _ in range(4))
+        order = np.asarray(self.order, dtype=np.int64)
+        by_level = order[np.argsort(np.asarray(level, dtype=np.int64)[order], kind='stable')].tolist()
+        pairs = {}
+        self._triangle_range = [None] * n
+        self._levels = []
+        start = level_start = 0
+        for position, x in enumerate(by_level):
+            k = len(self._up[x])
+            if k >= 2:
+                if k not in pairs:
+                    pairs[k] = np.triu_indices(k, 1)
+                i, j = pairs[k]
+                arcs = np.arange(arc_start[x], arc_start[x + 1])
+                ups = self.arc_high[arcs]
+                stop = start + len(i)
+                self.triangles[0][start:stop] = x
+                self.triangles[1][start:stop] = arcs[i]
+                self.triangles[2][start:stop] = arcs[j]
+                self.triangles[3][start:stop] = np.searchsorted(arc_key, ups[i] * n + self.rank[ups[j]])
+            else:
+                stop = start
+            self._triangle_range[x] = slice(start, stop)
+            start = stop
+            if position + 1 == n or level[by_level[position + 1]] != level[x]:
+                if start > level_start:
+                    self._levels.append(slice(level_start, start))
+                level_start = start
+        self.version = graph.version
+
+    def customize(self):
+        """Compute every arc's weight from the road weights, lowest triangles first."""
+        self.weight = self.base.copy()
+        self.middle = np.full(len(self.weight), -1, dtype=np.int64)
+        for triangles in self._levels:
+            self._relax(triangles)
+        self._searches.clear()
+
+    def _relax(self, triangles):
+        """Lower target arcs over their triangles; every target appears in only one level."""
+        lower_x, first, second, target = (column[triangles] for column in self.triangles)
+        candidate = self.weight[first] + self.weight[second]
+        better = candidate < self.weight[target]
+        if not better.any():
+            return
+        target, candidate, lower_x = target[better], candidate[better], lower_x[better]
+        order = np.lexsort((candidate, target))
+        target, candidate, lower_x = target[order], candidate[order], lower_x[order]
+        keep = np.ones(len(target), dtype=bool)
+        keep[1:] = target[1:] != target[:-1]
+        self.weight[target[keep]] = candidate[keep]
+        self.middle[target[keep]] = lower_x[keep]
+
+    def _sync(self):
+        """Fold roads added or re-weighted since the last query into the hierarchy."""
+        graph = self.graph
+        if graph.version == self.version:
+            return
+        n = graph.number_of_nodes()
+        if n != len(self.order):
+            # New nodes go on top of the order, so the contraction of the others stays valid and
+            # their roads are folded in as new arcs below; nested dissection is not run again.
+            self.order.extend(range(len(self.order), n))
+            self.rank = np.concatenate([self.rank, np.arange(len(self.rank), n)])
+            self._up_sets.extend(set() for _ in range(len(self._up_sets), n))
+        m = self._edge_count
+        changed = np.flatnonzero(graph.weights[:m] != self._weights)
+        rank = self.rank.tolist()
+        updates = []
+        for eid in changed.tolist() + list(range(m, graph.number_of_edges())):
+            u, v = int(graph.edge_u[eid]), int(graph.edge_v[eid])
+            if u == v:
+                continue
+            low, high = (u, v) if rank[u] < rank[v] else (v, u)
+            updates.append((eid, low, high, float(graph.weights[eid])))
+        missing = [(low, high) for _, low, high, _ in updates if (low, high) not in self._arc_index]
+        for low, high in missing:
+            self._insert_arc(low, high)
+        if missing or np.any(graph.weights[changed] > self._weights[changed]):
+            # New arcs need new triangles, and a road that got slower may leave cached minima
+            # stale, so both start over from the base weights.
+            self._rebuild()
+            return
+        for eid, low, high, weight in updates:
+            arc = self._arc_index[low, high]
+            if weight <= self.base[arc]:
+                self.base[arc] = weight
+                self.arc_edge[arc] = eid
+            if weight < self.weight[arc]:
+                self.weight[arc] = weight
+                self.middle[arc] = -1
+                # Only triangles below the ancestors of the road's lower end can improve.
+                x = low
+                while x >= 0:
+                    self._relax(self._triangle_range[x])
+                    x = self.parent[x]
+        self._edge_count = graph.number_of_edges()
+        self._weights = graph.weights.copy()
+        self._searches.clear()
+        self.version = graph.version
+        self.recustomizations += 1
+
+    def frozen(self):
+        """Copy answering queries on the graph as it is now, whatever later happens to the graph."""
+        self._sync()
+        hierarchy = copy.copy(self)
+        hierarchy.graph = self.graph.copy()
+        hierarchy.order = list(self.order)
+        for name in ('weight', 'base', 'middle', 'arc_edge', '_weights', '_dist', '_via'):
+            setattr(hierarchy, name, getattr(self, name).copy())
+        hierarchy._searches = OrderedDict()
+        return hierarchy
+
+    def _insert_arc(self, low, high):
+        """Add arc low-high to the up sets together with the fill-in keeping them chordal."""
+        rank = self.rank
+        pending = [(low, high)]
+        while pending:
+            v, u = pending.pop()
+            if u in self._up_sets[v]:
+                continue
+            for w in self._up_sets[v]:
+                pending.append((u, w) if rank[u] < rank[w] else (w, u))
+            self._up_sets[v].add(u)
+
+    def _rebuild(self):
+        self._build_arcs()
+        self.customize()
+        self.rebuilds += 1
+
+    def _search(self, source):
+        """(ancestors, distances, parent arcs) of the upward search from node id source.
+
+        The search space is exactly the elimination-tree ancestors of source, so no
+        priority queue is needed: relaxing them in rank order settles each one in turn.
+        """
+        search = self._searches.get(source)
+        if search is not None:
+            self.hits += 1
+            self._searches.move_to_end(source)
+            return search
+        self.misses += 1
+        chain = []
+        v = source
+        while v >= 0:
+            chain.append(v)
+            v = self.parent[v]
+        dist, via = self._dist, self._via
+        dist[source] = 0.0
+        weight, up, up_arcs = self.weight, self._up_nodes, self._up_arc_ids
+        for v in chain:
+            ups = up[v]
+            if len(ups):
+                arcs = up_arcs[v]
+                candidate = dist[v] + weight[arcs]
+                better = candidate < dist[ups]
+                dist[ups[better]] = candidate[better]
+                via[ups[better]] = arcs[better]
+        chain = np.asarray(chain, dtype=np.int64)
+        search = (chain, dist[chain], via[chain])
+        dist[chain] = np.inf
+        via[chain] = -1
+        self._searches[source] = search
+        if len(self._searches) > self.max_searches:
+            self._searches.popitem(last=False)
+        return search
+
+    def _meet(self, source, target):
+        """(distance, meeting node, forward search, backward search) of a source-target query."""
+        self._sync()
+        forward, backward = self._search(source), self._search(target)
+        # Both chains end at their tree's root; the shared suffix starts at their lowest common ancestor.
+        length = min(len(forward[0]), len(backward[0]))
+        same = forward[0][len(forward[0]) - length:] == backward[0][len(backward[0]) - length:]
+        common = length - (np.flatnonzero(~same)[-1] + 1 if not same.all() else 0)
+        if not common:
+            return np.inf, -1, forward, backward
+        total = forward[1][-common:] + backward[1][-common:]
+        best = int(np.argmin(total))
+        if not np.isfinite(total[best]):
+            return np.inf, -1, forward, backward
+        return float(total[best]), int(forward[0][len(forward[0]) - common + best]), forward, backward
+
+    def distance_ids(self, source, target):
+        """Shortest path length between node ids source and target, np.inf when unreachable."""
+        return self._meet(source, target)[0]
+
+    def distance(self, source, target):
+        """Shortest path length between labels source and target, np.inf when unreachable."""
+        index = self.graph.index
+        return self.distance_ids(index[source], index[target])
+
+    def path_ids(self, source, target):
+        """Node ids and edge ids of the shortest path between node ids source and target."""
+        if source == target:
+            return [source], []
+        best, meeting, forward, backward = self._meet(source, target)
+        if meeting < 0:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        nodes, edges = [source], []
+        for arc in self._arc_chain(forward, meeting)[::-1]:
+            self._unpack(arc, True, nodes, edges)
+        for arc in self._arc_chain(backward, meeting):
+            self._unpack(arc, False, nodes, edges)
+        return nodes, edges
+
+    def _arc_chain(self, search, node):
+        """Arcs of the search's tree from node down to its source."""
+        via = dict(zip(search[0].tolist(), search[2].tolist()))
+        chain = []
+        while via[node] >= 0:
+            chain.append(via[node])
+            node = int(self.arc_low[via[node]])
+        return chain
+
+    def _unpack(self, arc, upward, nodes, edges):
+        """Append the road edges and end nodes of arc, walked low to high when upward."""
+        stack = [(arc, upward)]
+        while stack:
+            arc, upward = stack.pop()
+            x = self.middle[arc]
+            if x < 0:
+                edges.append(int(self.arc_edge[arc]))
+                nodes.append(int(self.arc_high[arc] if upward else self.arc_low[arc]))
+                continue
+            low, high = int(self.arc_low[arc]), int(self.arc_high[arc])
+            to_low, to_high = self._arc_index[int(x), low], self._arc_index[int(x), high]
+            # low -> x -> high, or the reverse; pushed last-first.
+            if upward:
+                stack.append((to_high, True))
+                stack.append((to_low, False))
+            else:
+                stack.append((to_low, True))
+                stack.append((to_high, False))
+
+    def path(self, source, target):
+        """Shortest path from label source to label target."""
+        index = self.graph.index
+        nodes = self.graph.nodes
+        return [nodes[i] for i in self.path_ids(index[source], index[target])[0]]
+
+    def assign(self, starts, ends, edge_count):
+        """Edge loads of routing every (start, end) node-id pair, each distinct pair queried once."""
+        n = self.graph.number_of_nodes()
+        pairs, trips = np.unique(np.asarray(starts, dtype=np.int64) * n + ends, return_counts=True)
+        edge_ids, weights = [], []
+        for pair, count in zip(pairs.tolist(), trips.tolist()):
+            try:
+                path_edges = self.path_ids(pair // n, pair % n)[1]
+            except nx.NetworkXNoPath:
+                continue
+            edge_ids.extend(path_edges)
+            weights.extend([count] * len(path_edges))
+        return np.bincount(np.asarray(edge_ids, dtype=np.int64), weights=weights,
+                           minlength=edge_count).astype(np.int64)
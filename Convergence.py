@@ -0,0 +1,59 @@
+# Convergence.py
+import numpy as np
+
+
+class ConvergenceMonitor:
+    """Batch-means stopping rule for a running traffic simulation.
+
+    Every batch of routed trips contributes its edge shares (loads over total load). The
+    error bound is the widest per-edge confidence half-width of the mean share, relative to
+    the busiest edge's share. With ``top_k`` set, the best ``top_k`` candidate roads must
+    also stay the same for ``patience`` batches in a row. A run has converged once every
+    configured criterion holds and at least ``min_batches`` batches were seen.
+    """
+
+    def __init__(self, tolerance=0.01, top_k=None, patience=3, min_batches=10, z=1.96):
+        self.tolerance = tolerance
+        self.top_k = top_k
+        self.patience = patience
+        self.min_batches = min_batches
+        self.z = z
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self._mean = None
+        self._m2 = None
+        self._ranking = None
+        self.stable_batches = 0
+        self.error_bound = np.inf
+        self.converged = False
+
+    def update(self, loads, ranking=None):
+        """Add one batch of edge loads (and the current top roads); return whether converged."""
+        loads = np.asarray(loads, dtype=np.float64)
+        total = loads.sum()
+        if total > 0:
+            shares = loads / total
+            if self._mean is None or len(self._mean) != len(shares):
+                # Roads added mid-run change the share vector, so the batch statistics restart.
+                self._mean = np.zeros(len(shares))
+                self._m2 = np.zeros(len(shares))
+                self.batches = 0
+            self.batches += 1
+            delta = shares - self._mean
+            self._mean += delta / self.batches
+            self._m2 += delta * (shares - self._mean)
+            if self.batches > 1 and self._mean.max() > 0:
+                half_width = self.z * np.sqrt(self._m2 / (self.batches - 1) / self.batches)
+                self.error_bound = float(half_width.max() / self._mean.max())
+
+        if ranking is not None:
+            ranking = tuple(ranking)
+            self.stable_batches = self.stable_batches + 1 if ranking == self._ranking else 0
+            self._ranking = ranking
+
+        self.converged = (self.batches >= self.min_batches
+                          and (self.tolerance is None or self.error_bound <= self.tolerance)
+                          and (self.top_k is None or self.stable_batches >= self.patience))
+        return self.converged
@@ -0,0 +1,221 @@
+# Demand.py
+import math
+from heapq import heappop, heappush
+
+import numpy as np
+
+
+class AliasTable:
+    """Vose alias table: draws from a fixed discrete distribution in O(1) per sample.
+
+    Building the table is O(k) for k outcomes; sample() then needs one uniform column and
+    one uniform coin per draw, whatever the shape of the distribution.
+    """
+
+    __slots__ = ('probability', 'alias')
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64).reshape(-1)
+        if not len(weights) or not np.all(np.isfinite(weights)) or np.any(weights < 0) or weights.sum() <= 0:
+            raise ValueError("Alias table weights must be finite, non-negative and not all zero.")
+        k = len(weights)
+        scaled = (weights * (k / weights.sum())).tolist()
+        probability = [1.0] * k
+        alias = list(range(k))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            probability[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left over is 1 up to rounding and always keeps its own column.
+        self.probability = np.asarray(probability, dtype=np.float64)
+        self.alias = np.asarray(alias, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.probability)
+
+    def sample(self, rng, size):
+        """size outcome indices drawn with rng."""
+        column = rng.integers(len(self.probability), size=size)
+        return np.where(rng.random(size) < self.probability[column], column, self.alias[column])
+
+
+def _node_weights(graph, weights, name):
+    """Dense per-node-id array of a {label: weight} mapping; missing labels weigh 0."""
+    dense = np.zeros(graph.number_of_nodes(), dtype=np.float64)
+    for label, weight in weights.items():
+        if label not in graph.index:
+            raise KeyError(f"{name} names unknown node {label!r}")
+        dense[graph.index[label]] = weight
+    return dense
+
+
+class PairDemand:
+    """Demand bound to a CompactGraph as a sparse list of (origin, destination) node-id pairs.
+
+    Memory is O(pairs), and one alias table over the pairs draws whole batches of trips.
+    """
+
+    def __init__(self, n, origins, destinations, weights):
+        origins = np.asarray(origins, dtype=np.int64)
+        destinations = np.asarray(destinations, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        keep = (origins != destinations) & (weights > 0)
+        if not keep.any():
+            raise ValueError("The demand has no trips between distinct nodes.")
+        # Pairs are kept sorted by origin so shares_from() is a slice.
+        order = np.argsort(origins[keep], kind='stable')
+        self.n = n
+        self.pair_origins = origins[keep][order]
+        self.pair_destinations = destinations[keep][order]
+        self.shares = weights[keep][order] / weights[keep].sum()
+        self.table = AliasTable(self.shares)
+        self.origins = np.unique(self.pair_origins)
+        self._starts = np.searchsorted(self.pair_origins, np.arange(n + 1))
+
+    def sample(self, rng, trips):
+        """(starts, ends) node ids of trips drawn from the demand."""
+        pairs = self.table.sample(rng, trips)
+        return self.pair_origins[pairs], self.pair_destinations[pairs]
+
+    def shares_from(self, origin):
+        """Dense per-node array of the share of all trips going from origin to each node."""
+        first, last = self._starts[origin], self._starts[origin + 1]
+        shares = np.zeros(self.n, dtype=np.float64)
+        np.add.at(shares, self.pair_destinations[first:last], self.shares[first:last])
+        return shares
+
+
+class ZoneDemand:
+    """Demand bound to a CompactGraph as independent origin and destination weights.
+
+    A trip's origin follows production and its destination attraction; pairs with equal
+    ends are redrawn, so the share of trips from o to d is proportional to
+    ``production[o] * attraction[d]`` over distinct pairs. Memory is O(n).
+    """
+
+    def __init__(self, production, attraction):
+        production = np.asarray(production, dtype=np.float64)
+        attraction = np.asarray(attraction, dtype=np.float64)
+        self.production = production / production.sum()
+        self.attraction = attraction / attraction.sum()
+        # Total weight of distinct pairs, which normalizes shares_from().
+        self._total = 1.0 - float(self.production @ self.attraction)
+        if self._total <= 1e-12:
+            raise ValueError("The demand has no trips between distinct nodes.")
+        self.n = len(production)
+        self.origins = np.flatnonzero(self.production)
+        self._production_table = AliasTable(self.production)
+        self._attraction_table = AliasTable(self.attraction)
+
+    def sample(self, rng, trips):
+        """(starts, ends) node ids of trips drawn from the demand."""
+        starts = self._production_table.sample(rng, trips)
+        ends = self._attraction_table.sample(rng, trips)
+        same = np.flatnonzero(starts == ends)
+        while len(same):
+            starts[same] = self._production_table.sample(rng, len(same))
+            ends[same] = self._attraction_table.sample(rng, len(same))
+            same = same[starts[same] == ends[same]]
+        return starts, ends
+
+    def shares_from(self, origin):
+        """Dense per-node array of the share of all trips going from origin to each node."""
+        shares = self.production[origin] * self.attraction / self._total
+        shares[origin] = 0.0
+        return shares
+
+
+class ODMatrix:
+    """Explicit sparse origin-destination demand.
+
+    ``trips`` maps (origin, destination) labels to a trip weight, or is an iterable of
+    (origin, destination, weight) triples. Only relative weights matter: the simulation's
+    agent_count sets the number of trips.
+    """
+
+    def __init__(self, trips):
+        if hasattr(trips, 'items'):
+            trips = ((origin, destination, weight) for (origin, destination), weight in trips.items())
+        self.trips = list(trips)
+
+    def bind(self, graph):
+        """PairDemand of this matrix over graph's node ids."""
+        index = graph.index
+        try:
+            origins = [index[origin] for origin, _, _ in self.trips]
+            destinations = [index[destination] for _, destination, _ in self.trips]
+        except KeyError as e:
+            raise KeyError(f"OD matrix names unknown node {e.args[0]!r}") from None
+        return PairDemand(graph.number_of_nodes(), origins, destinations, [weight for _, _, weight in self.trips])
+
+
+class ProductionAttraction:
+    """Per-node production (trips leaving) and attraction (trips arriving) weights.
+
+    Both map node labels to weights; unlisted nodes weigh 0 and attraction defaults to
+    production.
+    """
+
+    def __init__(self, production, attraction=None):
+        self.production = dict(production)
+        self.attraction = dict(attraction) if attraction is not None else self.production
+
+    def bind(self, graph):
+        """ZoneDemand of these weights over graph's node ids."""
+        return ZoneDemand(_node_weights(graph, self.production, 'Production'),
+                          _node_weights(graph, self.attraction, 'Attraction'))
+
+
+class GravityModel:
+    """Gravity demand: trips from o to d proportional to P[o] * A[d] * exp(-beta * cost(o, d)).
+
+    Costs are shortest path lengths over the road weights. Pairs further apart than
+    ``max_cost`` are left out, so memory grows with the pairs in reach rather than with
+    n^2; by default the cutoff drops pairs whose deterrence falls below 1e-3.
+    """
+
+    def __init__(self, production, attraction=None, beta=0.1, max_cost=None):
+        if beta <= 0 and max_cost is None:
+            raise ValueError("A gravity model without decay needs an explicit max_cost.")
+        self.production = dict(production)
+        self.attraction = dict(attraction) if attraction is not None else self.production
+        self.beta = beta
+        self.max_cost = max_cost if max_cost is not None else math.log(1e3) / beta
+
+    def bind(self, graph):
+        """PairDemand over every origin-destination pair within max_cost of each other."""
+        production = _node_weights(graph, self.production, 'Production')
+        attraction = _node_weights(graph, self.attraction, 'Attraction').tolist()
+        origins, destinations, weights = [], [], []
+        for origin in np.flatnonzero(production).tolist():
+            for destination, cost in _costs_within(graph, origin, self.max_cost):
+                if attraction[destination] > 0:
+                    origins.append(origin)
+                    destinations.append(destination)
+                    weights.append(production[origin] * attraction[destination] * math.exp(-self.beta * cost))
+        return PairDemand(graph.number_of_nodes(), origins, destinations, weights)
+
+
+def _costs_within(graph, source, max_cost):
+    """(node id, shortest path cost) of every node other than source within max_cost of it."""
+    indptr, indices, incident, weights = graph.adjacency_lists()
+    dist = {source: 0.0}
+    done = set()
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        if u != source:
+            yield u, d
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            nd = d + weights[incident[k]]
+            if nd <= max_cost and nd < dist.get(v, math.inf):
+                dist[v] = nd
+                heappush(heap, (nd, v))
@@ -0,0 +1,68 @@
+# EdgeCounts.py
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+class EdgeCountView(MutableMapping):
+    """Dict-like view of traffic counts stored in an integer array, one slot per edge.
+
+    Keys are the edges in the orientation they were registered with, exactly like the
+    ``{edge: 0 for edge in graph.edges()}`` dict it replaces, so ``nt.get((u, v), 0) +
+    nt.get((v, u), 0)`` keeps counting every road once.
+    """
+
+    def __init__(self, edges):
+        self.edges = []
+        self.index = {}
+        self.counts = np.zeros(0, dtype=np.int64)
+        for edge in edges:
+            self.add_edge(edge)
+
+    def add_edge(self, edge):
+        """Register a new edge with a zero count and return its slot."""
+        edge = tuple(edge)
+        if edge in self.index:
+            return self.index[edge]
+        slot = len(self.edges)
+        self.edges.append(edge)
+        self.index[edge] = slot
+        if slot >= len(self.counts):
+            grown = np.zeros(max(2 * len(self.counts), 16), dtype=np.int64)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+        return slot
+
+    def slot(self, u, v):
+        """Array slot of the road between u and v in either orientation, or None."""
+        slot = self.index.get((u, v))
+        return self.index.get((v, u)) if slot is None else slot
+
+    @property
+    def array(self):
+        """Counts of the registered edges, in registration order."""
+        return self.counts[:len(self.edges)]
+
+    def __getitem__(self, edge):
+        return int(self.counts[self.index[edge]])
+
+    def __setitem__(self, edge, value):
+        self.counts[self.add_edge(edge)] = value
+
+    def __delitem__(self, edge):
+        raise TypeError("Edges cannot be removed from an EdgeCountView.")
+
+    def __contains__(self, edge):
+        return edge in self.index
+
+    def __iter__(self):
+        return iter(list(self.edges))
+
+    def __len__(self):
+        return len(self.edges)
+
+    def copy(self):
+        return dict(zip(self.edges, self.array.tolist()))
+
+    def __repr__(self):
+        return repr(self.copy())
@@ -0,0 +1,154 @@
+# Equilibrium.py
+from array import array
+
+import numpy as np
+
+from Assignment import tree_loads
+
+EQUILIBRIUM_METHODS = ('msa', 'frank-wolfe')
+
+
+def bpr_costs(free_flow, flows, capacity, alpha=0.15, beta=4.0):
+    """BPR travel time of every edge: free_flow * (1 + alpha * (flows / capacity) ** beta)."""
+    return free_flow * (1.0 + alpha * (flows / capacity) ** beta)
+
+
+def beckmann_objective(free_flow, flows, capacity, alpha, beta):
+    """Beckmann objective: the summed integral of every edge's BPR cost from 0 to its flow."""
+    return float(np.sum(free_flow * (flows + alpha * capacity / (beta + 1) * (flows / capacity) ** (beta + 1))))
+
+
+class EquilibriumAssignment:
+    """User equilibrium of all-pairs demand (uniform by default) under BPR (volume/delay) link costs.
+
+    Starts from an all-or-nothing assignment at free-flow costs, then moves flows toward
+    the all-or-nothing assignment of the current costs, by 1/k steps (``method='msa'``) or
+    an exact line search on the Beckmann objective (``'frank-wolfe'``), until the relative
+    gap drops below ``tolerance``. ``capacity`` defaults to the mean free-flow load, so an
+    average road runs at capacity.
+
+    ``demand``, a bound model from Demand.py, spreads the same total number of trips
+    (``trips_per_pair`` per ordered pair of distinct nodes) over its origin-destination
+    shares instead of uniformly.
+
+    Shortest-path trees are kept between iterations: a tree retimed under the new costs
+    stays optimal as long as no edge has a negative reduced cost, and only sources whose
+    tree fails that check run Dijkstra again.
+    """
+
+    def __init__(self, graph, trips_per_pair, capacity=None, alpha=0.15, beta=4.0, method='frank-wolfe',
+                 tolerance=1e-3, max_iterations=50, demand=None):
+        if method not in EQUILIBRIUM_METHODS:
+            raise ValueError(f"Unknown equilibrium method {method!r}, expected one of {EQUILIBRIUM_METHODS}")
+        self.graph = graph
+        self.trips_per_pair = trips_per_pair
+        self.demand = demand
+        self.capacity = capacity
+        self.alpha = alpha
+        self.beta = beta
+        self.method = method
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.free_flow = np.asarray(graph.weights, dtype=np.float64)
+        self.flows = None
+        self.costs = self.free_flow.copy()
+        self.relative_gap = np.inf
+        self._capacity = None
+        self.trees_reused = 0
+        self.trees_computed = 0
+        self._trees = {}
+
+    def link_costs(self, flows):
+        return bpr_costs(self.free_flow, flows, self._capacity, self.alpha, self.beta)
+
+    def all_or_nothing(self, costs):
+        """Flows of routing every pair's demand on its shortest path under costs."""
+        m = self.graph.number_of_edges()
+        n = self.graph.number_of_nodes()
+        if self.demand is not None:
+            loads = np.zeros(m, dtype=np.float64)
+            for source in self.demand.origins.tolist():
+                loads += tree_loads(self._tree(source, costs), m, self.demand.shares_from(source))
+            return loads * (float(self.trips_per_pair) * n * (n - 1))
+        loads = np.zeros(m, dtype=np.int64)
+        for source in range(n):
+            loads += tree_loads(self._tree(source, costs), m)
+        return loads * float(self.trips_per_pair)
+
+    def _tree(self, source, costs):
+        tree = self._trees.get(source)
+        if tree is not None:
+            tree = self._retimed(tree, costs)
+        if tree is None:
+            tree = self.graph.shortest_path_tree(source, weights=costs)
+            self.trees_computed += 1
+        else:
+            self.trees_reused += 1
+        self._trees[source] = tree
+        return tree
+
+    def _retimed(self, tree, costs):
+        """The tree with distances under costs, or None if some edge now offers a shortcut."""
+        _, pred, pred_edge, order = tree
+        edge_costs = costs.tolist()
+        dist = [np.inf] * len(pred)
+        dist[order[0]] = 0.0
+        for node in order[1:]:
+            dist[node] = dist[pred[node]] + edge_costs[pred_edge[node]]
+
+        d = np.asarray(dist)
+        du, dv = d[self.graph.edge_u], d[self.graph.edge_v]
+        reached = np.isfinite(du)
+        slack = 1e-12 * max(d[np.isfinite(d)].max(), 1.0)
+        if np.any(du[reached] + costs[reached] < dv[reached] - slack) or \
+                np.any(dv[reached] + costs[reached] < du[reached] - slack):
+            return None
+        return array('d', dist), pred, pred_edge, order
+
+    def iterate(self):
+        """Run the assignment, yielding (iteration, relative gap) after every step."""
+        self.flows = self.all_or_nothing(self.free_flow)
+        self._capacity = self.capacity
+        if self._capacity is None:
+            self._capacity = max(float(self.flows[self.flows > 0].mean()), 1.0) if self.flows.any() else 1.0
+        self._capacity = np.broadcast_to(np.asarray(self._capacity, dtype=np.float64), self.flows.shape)
+
+        for iteration in range(1, self.max_iterations + 1):
+            self.costs = self.link_costs(self.flows)
+            target = self.all_or_nothing(self.costs)
+            total_cost = float(self.flows @ self.costs)
+            self.relative_gap = (total_cost - float(target @ self.costs)) / total_cost if total_cost > 0 else 0.0
+            yield iteration, self.relative_gap
+            if self.relative_gap <= self.tolerance:
+                break
+            step = 1.0 / (iteration + 1) if self.method == 'msa' else self._line_search(target)
+            self.flows = self.flows + step * (target - self.flows)
+        self.costs = self.link_costs(self.flows)
+
+    def solve(self):
+        """Run to equilibrium and return the edge flows."""
+        for _ in self.iterate():
+            pass
+        return self.flows
+
+    def objective(self, flows):
+        """Beckmann objective of flows under this assignment's link cost functions."""
+        return beckmann_objective(self.free_flow, flows, self._capacity, self.alpha, self.beta)
+
+    def _line_search(self, target, steps=40):
+        """Step in [0, 1] minimizing the Beckmann objective along flows -> target (bisection)."""
+        direction = target - self.flows
+
+        def slope(step):
+            return float(direction @ self.link_costs(self.flows + step * direction))
+
+        if slope(1.0) <= 0:
+            return 1.0
+        low, high = 0.0, 1.0
+        for _ in range(steps):
+            middle = (low + high) / 2
+            if slope(middle) > 0:
+                high = middle
+            else:
+                low = middle
+        return (low + high) / 2
@@ -0,0 +1,149 @@
+# GraphIO.py
+import csv
+import itertools
+import json
+import struct
+from operator import itemgetter
+
+import numpy as np
+
+from CompactGraph import CompactGraph
+
+GRAPH_FORMATS = ('csv', 'binary')
+CSV_FIELDS = ['From', 'To', 'Weight']
+# Binary layout: magic, node count, edge count and label byte count, then the node labels
+# as a UTF-8 JSON list and the edge_u (int64), edge_v (int64) and weights (float64) columns.
+BINARY_MAGIC = b'PFEDGES1'
+_HEADER = struct.Struct('<8sQQQ')
+DEFAULT_CHUNK_ROWS = 1 << 18
+
+
+def graph_format(path, format=None):
+    """The explicit format, else 'csv' for .csv paths and 'binary' for anything else."""
+    format = format or ('csv' if path.lower().endswith('.csv') else 'binary')
+    if format not in GRAPH_FORMATS:
+        raise ValueError(f"Unknown graph format {format!r}, expected one of {GRAPH_FORMATS}")
+    return format
+
+
+class _DenseIndex(dict):
+    """Label -> dense id map that hands out the next id to every label it has not seen."""
+
+    def __missing__(self, label):
+        self[label] = node = len(self)
+        return node
+
+    def ids(self, labels):
+        return np.fromiter(map(self.__getitem__, labels), dtype=np.int64, count=len(labels))
+
+
+def _json_label(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store node label {value!r} in a binary edge list")
+
+
+def _read_header(f, path):
+    magic, node_count, edge_count, label_bytes = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"{path} is not a binary edge list")
+    labels = [tuple(label) if isinstance(label, list) else label for label in json.loads(f.read(label_bytes))]
+    if len(labels) != node_count:
+        raise ValueError(f"{path} is truncated")
+    return labels, edge_count
+
+
+def iter_edge_chunks(path, format=None, chunk_rows=DEFAULT_CHUNK_ROWS, node_type=None):
+    """Stream (from labels, to labels, weights) blocks of at most chunk_rows edges.
+
+    CSV labels are strings unless node_type (e.g. int) converts them; binary files keep
+    the label types they were written with.
+    """
+    if graph_format(path, format) == 'binary':
+        with open(path, 'rb') as f:
+            labels, edge_count = _read_header(f, path)
+            start = f.tell()
+            for first in range(0, edge_count, chunk_rows):
+                rows = min(chunk_rows, edge_count - first)
+                columns = []
+                for column, dtype in enumerate(('<i8', '<i8', '<f8')):
+                    f.seek(start + 8 * (column * edge_count + first))
+                    columns.append(np.fromfile(f, dtype=dtype, count=rows))
+                yield [labels[u] for u in columns[0].tolist()], [labels[v] for v in columns[1].tolist()], columns[2]
+        return
+
+    with open(path, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if header is None:
+            return
+        fields = itemgetter(*(header.index(field) for field in CSV_FIELDS))
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                return
+            sources, targets, weights = (list(column) for column in zip(*map(fields, rows)))
+            if node_type is not None:
+                sources, targets = list(map(node_type, sources)), list(map(node_type, targets))
+            yield sources, targets, np.array(weights, dtype=np.float64)
+
+
+def read_edge_list(path, format=None, chunk_rows=DEFAULT_CHUNK_ROWS, node_type=None):
+    """Load a weighted edge list straight into a CompactGraph.
+
+    Labels are mapped to dense ids once, in order of first appearance, while the file
+    streams in chunks. A road listed twice keeps its first position and its last weight,
+    like networkx's add_edge.
+    """
+    if graph_format(path, format) == 'binary':
+        with open(path, 'rb') as f:
+            labels, edge_count = _read_header(f, path)
+            columns = [np.fromfile(f, dtype=dtype, count=edge_count) for dtype in ('<i8', '<i8', '<f8')]
+        if any(len(column) != edge_count for column in columns):
+            raise ValueError(f"{path} is truncated")
+        return _compact(labels, *columns)
+
+    index = _DenseIndex()
+    edge_u, edge_v, weights = [], [], []
+    for sources, targets, chunk_weights in iter_edge_chunks(path, 'csv', chunk_rows, node_type):
+        edge_u.append(index.ids(sources))
+        edge_v.append(index.ids(targets))
+        weights.append(chunk_weights)
+    if not edge_u:
+        return CompactGraph()
+    return _compact(list(index), np.concatenate(edge_u), np.concatenate(edge_v), np.concatenate(weights))
+
+
+def _compact(nodes, edge_u, edge_v, weights):
+    n = len(nodes)
+    keys = np.minimum(edge_u, edge_v) * n + np.maximum(edge_u, edge_v)
+    unique, first = np.unique(keys, return_index=True)
+    if len(unique) < len(keys):
+        last = len(keys) - 1 - np.unique(keys[::-1], return_index=True)[1]
+        order = np.argsort(first)
+        edge_u, edge_v, weights = edge_u[first[order]], edge_v[first[order]], weights[last[order]]
+    return CompactGraph(nodes, np.stack([edge_u, edge_v], axis=1), weights)
+
+
+def write_edge_list(path, graph, format=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write a CompactGraph or networkx graph as a CSV or binary weighted edge list."""
+    if not isinstance(graph, CompactGraph):
+        graph = CompactGraph.from_networkx(graph)
+    if graph_format(path, format) == 'binary':
+        labels = json.dumps(graph.nodes, default=_json_label).encode()
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(BINARY_MAGIC, graph.number_of_nodes(), graph.number_of_edges(), len(labels)))
+            f.write(labels)
+            for column, dtype in ((graph.edge_u, '<i8'), (graph.edge_v, '<i8'), (graph.weights, '<f8')):
+                np.ascontiguousarray(column, dtype=dtype).tofile(f)
+        return
+
+    nodes = graph.nodes
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_FIELDS)
+        for first in range(0, graph.number_of_edges(), chunk_rows):
+            last = first + chunk_rows
+            writer.writerows(zip([nodes[u] for u in graph.edge_u[first:last].tolist()],
+                                 [nodes[v] for v in graph.edge_v[first:last].tolist()],
+                                 graph.weights[first:last].tolist()))
@@ -0,0 +1,174 @@
+# GraphLayout.py
+import hashlib
+import os
+
+import networkx as nx
+import numpy as np
+
+from CompactGraph import CompactGraph
+
+DEFAULT_CACHE_DIR = '.layout_cache'
+# Up to this many nodes networkx's exact spring layout is fast enough.
+SPRING_LIMIT = 500
+
+
+def edge_list_hash(graph):
+    """Content hash of a graph's node and edge sets, independent of order and label types.
+
+    Labels are compared as strings, so a network loaded back from GraphEdges.csv hashes the
+    same as the simulated graph that wrote it.
+    """
+    nodes = sorted(str(node) for node in graph.nodes())
+    edges = sorted('\t'.join(sorted((str(u), str(v)))) for u, v in graph.edges())
+    digest = hashlib.sha1()
+    digest.update('\n'.join(nodes).encode())
+    digest.update(b'\0')
+    digest.update('\n'.join(edges).encode())
+    return digest.hexdigest()
+
+
+def grid_force_layout(edge_u, edge_v, n, pos=None, iterations=60, temperature=0.1, grid=32, seed=0, fixed=None):
+    """Fruchterman-Reingold layout with grid-approximated repulsion, as an (n, 2) array.
+
+    Nodes are repelled by the centroids of the occupied cells of a grid x grid mesh instead
+    of by every other node, so one iteration costs O(n * grid^2 + m) rather than O(n^2).
+    ``pos`` warm-starts the layout; pass a low ``temperature`` to only refine it. Nodes
+    flagged in the boolean array ``fixed`` never move.
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2)) if pos is None else np.array(pos, dtype=np.float64)
+    if n < 2:
+        return pos
+    k = 1.0 / np.sqrt(n)
+    # Repulsion is only worth computing for the nodes that can move.
+    active = np.arange(n) if fixed is None else np.flatnonzero(~np.asarray(fixed, dtype=bool))
+    chunk = max(1, (1 << 22) // (grid * grid))
+    for step in range(iterations):
+        low = pos.min(axis=0)
+        span = np.maximum(pos.max(axis=0) - low, 1e-9)
+        cell_xy = np.minimum(((pos - low) / span * grid).astype(np.int64), grid - 1)
+        cell = cell_xy[:, 0] * grid + cell_xy[:, 1]
+        mass = np.bincount(cell, minlength=grid * grid).astype(np.float64)
+        sum_x = np.bincount(cell, weights=pos[:, 0], minlength=grid * grid)
+        sum_y = np.bincount(cell, weights=pos[:, 1], minlength=grid * grid)
+        occupied = np.flatnonzero(mass)
+
+        displacement = np.zeros_like(pos)
+        for first in range(0, len(active), chunk):
+            nodes = active[first:first + chunk]
+            # Leave each node itself out of its own cell's centroid.
+            own = occupied[None, :] == cell[nodes, None]
+            cell_mass = mass[occupied][None, :] - own
+            cx = (sum_x[occupied][None, :] - own * pos[nodes, 0, None]) / np.maximum(cell_mass, 1)
+            cy = (sum_y[occupied][None, :] - own * pos[nodes, 1, None]) / np.maximum(cell_mass, 1)
+            dx = pos[nodes, 0, None] - cx
+            dy = pos[nodes, 1, None] - cy
+            distance2 = np.maximum(dx * dx + dy * dy, 1e-6 * k * k)
+            strength = k * k * cell_mass / distance2
+            displacement[nodes, 0] += (strength * dx).sum(axis=1)
+            displacement[nodes, 1] += (strength * dy).sum(axis=1)
+
+        delta = pos[edge_u] - pos[edge_v]
+        distance = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-9)
+        pull = delta * (distance / k)[:, None]
+        for axis in range(2):
+            displacement[:, axis] -= np.bincount(edge_u, weights=pull[:, axis], minlength=n)
+            displacement[:, axis] += np.bincount(edge_v, weights=pull[:, axis], minlength=n)
+
+        if fixed is not None:
+            displacement[fixed] = 0.0
+        length = np.maximum(np.hypot(displacement[:, 0], displacement[:, 1]), 1e-9)
+        limit = temperature * (1 - step / iterations)
+        pos += displacement * (np.minimum(length, limit) / length)[:, None]
+    return pos
+
+
+def _normalized(pos):
+    """Positions centered and scaled into [-1, 1], like networkx layouts."""
+    pos = pos - pos.mean(axis=0)
+    scale = np.abs(pos).max()
+    return pos / scale if scale > 0 else pos
+
+
+class LayoutService:
+    """Node positions cached on disk under the graph's edge_list_hash.
+
+    Small graphs use networkx's spring layout, large ones grid_force_layout. update() reuses
+    the previous positions after roads are added: existing nodes stay put, so the view keeps
+    its shape, and only new nodes are placed and refined.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, seed=0):
+        self.cache_dir = cache_dir
+        self.seed = seed
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _load(self, graph, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as stored:
+            xy = dict(zip(stored['nodes'].tolist(), stored['xy']))
+        try:
+            return {node: xy[str(node)] for node in graph.nodes()}
+        except KeyError:
+            return None
+
+    def _save(self, key, pos):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, nodes=np.array([str(node) for node in pos]), xy=np.array(list(pos.values())))
+        os.replace(tmp_path, path)
+
+    def positions(self, graph):
+        """Positions of every node of graph, from the cache when this edge list was laid out before."""
+        key = edge_list_hash(graph)
+        pos = self._load(graph, key)
+        if pos is None:
+            pos = self._compute(graph)
+            self._save(key, pos)
+        return pos
+
+    def update(self, graph, previous):
+        """Positions for graph after roads (and possibly nodes) were added to a laid-out graph."""
+        key = edge_list_hash(graph)
+        pos = self._load(graph, key)
+        if pos is not None:
+            return pos
+        new_nodes = [node for node in graph.nodes() if node not in previous]
+        if not new_nodes:
+            pos = {node: np.asarray(previous[node]) for node in graph.nodes()}
+        else:
+            pos = self._compute(graph, previous)
+        self._save(key, pos)
+        return pos
+
+    def _compute(self, graph, previous=None):
+        nodes = list(graph.nodes())
+        if previous is not None:
+            # New nodes start next to their placed neighbors; the rest keep their position.
+            init = {node: np.asarray(previous[node]) for node in nodes if node in previous}
+            rng = np.random.default_rng(self.seed)
+            for node in nodes:
+                if node not in init:
+                    placed = [init[v] for v in graph.neighbors(node) if v in init]
+                    init[node] = np.mean(placed, axis=0) + rng.normal(0, 0.01, 2) if placed \
+                        else rng.uniform(-1, 1, 2)
+        if len(nodes) <= SPRING_LIMIT:
+            if previous is None:
+                return nx.spring_layout(graph, weight=None, seed=self.seed)
+            fixed = [node for node in nodes if node in previous]
+            return nx.spring_layout(graph, pos=init, fixed=fixed or None, weight=None, seed=self.seed)
+
+        core = CompactGraph.from_networkx(graph)
+        if previous is None:
+            xy = _normalized(grid_force_layout(core.edge_u, core.edge_v, len(nodes), seed=self.seed))
+        else:
+            start = np.array([init[label] for label in core.nodes])
+            fixed = np.array([label in previous for label in core.nodes])
+            xy = grid_force_layout(core.edge_u, core.edge_v, len(nodes), pos=start, iterations=15,
+                                   temperature=0.05, seed=self.seed, fixed=fixed)
+        return dict(zip(core.nodes, xy))
@@ -0,0 +1,114 @@
+# GraphRenderer.py
+import time
+
+import numpy as np
+
+# Node labels are only drawn for graphs up to this many nodes.
+LABEL_LIMIT = 200
+
+
+class GraphRenderer:
+    """Draws a graph once as persistent matplotlib artists and afterwards only restyles them.
+
+    Roads are one LineCollection each for the plain network, the traffic heat overlay, the
+    candidate roads and the highlighted path. Frames restore a cached background and blit the
+    changing artists, and update() drops frames beyond ``max_fps``.
+    """
+
+    def __init__(self, ax, canvas, pos, edges, potential_roads=(), max_fps=10.0, node_size=500, labels=None):
+        from matplotlib.collections import LineCollection
+
+        self.ax = ax
+        self.canvas = canvas
+        self.pos = pos
+        self.max_fps = max_fps
+        self.edges = []
+        self._counts = None
+        self._path = None
+        self._last_frame = None
+        self._background = None
+        self._blit = bool(getattr(canvas, 'supports_blit', False))
+
+        ax.clear()
+        ax.axis('off')
+        self.base = LineCollection([], colors='k', linewidths=1, zorder=1)
+        self.roads = LineCollection(self._segments(potential_roads), colors='green', linestyles='dashed', zorder=1)
+        self.heat = LineCollection([], linewidths=2, zorder=2)
+        self.path = LineCollection([], colors='navy', linewidths=3, zorder=3)
+        for collection in (self.base, self.roads, self.heat, self.path):
+            ax.add_collection(collection)
+
+        nodes = list(pos)
+        xy = np.array([pos[node] for node in nodes], dtype=np.float64).reshape(-1, 2)
+        self.nodes = ax.scatter(xy[:, 0], xy[:, 1], s=node_size, c='skyblue', zorder=4)
+        self.labels = []
+        if labels if labels is not None else len(nodes) <= LABEL_LIMIT:
+            self.labels = [ax.text(x, y, str(node), ha='center', va='center', zorder=5)
+                           for node, (x, y) in zip(nodes, xy.tolist())]
+        # Animated artists are left out of full redraws and blitted over the cached background.
+        self.animated = [self.heat, self.path, self.nodes, *self.labels]
+        for artist in self.animated:
+            artist.set_animated(self._blit)
+
+        self.set_edges(edges)
+        ax.autoscale_view()
+        canvas.mpl_connect('draw_event', self._on_draw)
+        canvas.draw()
+
+    def _segments(self, edges):
+        pos = self.pos
+        return np.array([(pos[u], pos[v]) for u, v in edges], dtype=np.float64).reshape(-1, 2, 2)
+
+    def set_edges(self, edges):
+        """Replace the drawn roads, e.g. after new roads were added to the graph."""
+        self.edges = list(edges)
+        segments = self._segments(self.edges)
+        self.base.set_segments(segments)
+        self.heat.set_segments(segments)
+        self._colors = np.zeros((len(self.edges), 4))
+        self._colors[:, 0] = 1.0
+        self.heat.set_color(self._colors)
+        if self._background is not None:
+            self.canvas.draw()
+
+    def frame_due(self):
+        """Whether the frame-rate cap allows drawing a frame now."""
+        return self._last_frame is None or time.monotonic() - self._last_frame >= 1.0 / self.max_fps
+
+    def update(self, counts=None, path=None, force=False):
+        """Show per-edge counts (in edge order) and a node path; returns False for dropped frames."""
+        if counts is not None:
+            self._counts = counts
+        if path is not None:
+            self._path = path
+        if not force and not self.frame_due():
+            return False
+        self._last_frame = time.monotonic()
+
+        if self._counts is not None:
+            counts = np.asarray(self._counts, dtype=np.float64)[:len(self.edges)]
+            top = counts.max() if len(counts) else 0.0
+            intensity = np.log1p(counts) / np.log1p(top) if top > 0 else np.zeros_like(counts)
+            self._colors[:, 3] = intensity
+            self.heat.set_color(self._colors)
+            self.heat.set_linewidths(1 + 2 * intensity)
+        if self._path is not None:
+            self.path.set_segments(self._segments(zip(self._path, self._path[1:])))
+
+        if self._blit and self._background is not None:
+            self.canvas.restore_region(self._background)
+            self._draw_animated()
+            self.canvas.blit(self.ax.bbox)
+        else:
+            self.canvas.draw_idle()
+        return True
+
+    def _draw_animated(self):
+        for artist in self.animated:
+            self.ax.draw_artist(artist)
+
+    def _on_draw(self, event):
+        """Recapture the static background after every full redraw (first draw, resize)."""
+        if self._blit:
+            self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+            self._draw_animated()
@@ -0,0 +1,95 @@
+# HeadlessRunner.py
+import argparse
+import json
+import os
+import random
+
+from Convergence import ConvergenceMonitor
+from LargerNetwork import initialize_graph, load_network
+from SimulationLogic import ROUTING_BACKENDS, SIMULATION_MODES, TrafficSimulation
+from TrafficIO import road_details_json
+
+
+def run(nodes=60, k=3, roads=1, iterations=36000, agent_count=100, mode='batched', seed=None, workers=None,
+        output_dir='results', csv_export=False, tolerance=None, stable_top_k=None, checkpoint_path=None,
+        resume=None, graph_path=None, routing='tree'):
+    """Build a network, simulate traffic, select roads and write every result to output_dir.
+
+    graph_path loads the network from an edge list instead of generating one. With resume,
+    the network, settings and progress come from that checkpoint instead.
+    """
+    convergence = None
+    if tolerance is not None or stable_top_k:
+        convergence = ConvergenceMonitor(tolerance=tolerance, top_k=stable_top_k)
+    if resume:
+        simulation = TrafficSimulation.from_checkpoint(resume, workers=workers, convergence=convergence)
+        graph, potential_roads = simulation.original_core, simulation.potential_roads
+        nodes, iterations, agent_count = graph.number_of_nodes(), simulation.iterations, simulation.agent_count
+        mode, seed, output_dir = simulation.mode, simulation.seed, simulation.output_dir
+    else:
+        if seed is not None:
+            random.seed(seed)  # watts_strogatz_graph draws from the global random state
+        if graph_path:
+            graph, potential_roads = load_network(graph_path)
+            nodes = graph.number_of_nodes()
+        else:
+            graph, potential_roads = initialize_graph(nodes=nodes, k=k)
+        simulation = TrafficSimulation(graph, potential_roads, iterations=iterations, agent_count=agent_count,
+                                       mode=mode, seed=seed, workers=workers, csv_export=csv_export,
+                                       output_dir=output_dir, convergence=convergence,
+                                       checkpoint_path=checkpoint_path, routing=routing)
+    for progress in simulation.simulate_traffic():
+        pass
+    print(progress['message'])
+
+    selected = simulation.evaluate_and_update_road_benefits(k=roads) if potential_roads else []
+    results = {
+        'nodes': nodes,
+        'edges': simulation.original_core.number_of_edges(),
+        'iterations': iterations,
+        'completed_iterations': simulation.completed_iterations,
+        'error_bound': progress.get('error_bound'),
+        'agent_count': agent_count,
+        'mode': mode,
+        'seed': seed,
+        'selected_roads': [road_details_json(detail) for detail in selected],
+    }
+    with open(simulation.output_path("SelectedRoads.json"), 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved successfully to {os.path.abspath(output_dir)}.")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a traffic simulation and road selection without the GUI.")
+    parser.add_argument('--nodes', type=int, default=60)
+    parser.add_argument('--k', type=int, default=3, help="Nearest neighbors of the Watts-Strogatz graph.")
+    parser.add_argument('--roads', type=int, default=1, help="Number of roads to select.")
+    parser.add_argument('--iterations', type=int, default=36000)
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--mode', choices=SIMULATION_MODES, default='batched')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='results')
+    parser.add_argument('--csv', action='store_true', help="Also write TrafficCounts.csv.")
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help="Stop once the relative edge-share confidence half-width is below this.")
+    parser.add_argument('--stable-top-k', type=int, default=None,
+                        help="Stop once the top k candidate roads stay unchanged for several batches.")
+    parser.add_argument('--checkpoint', default=None, help="Write periodic checkpoints to this .npz file.")
+    parser.add_argument('--resume', default=None, help="Continue the run saved in this checkpoint.")
+    parser.add_argument('--routing', choices=ROUTING_BACKENDS, default='tree',
+                        help="Point-to-point routing backend; 'ch' suits large near-planar road networks "
+                             "and falls back to 'tree' on graphs it cannot contract compactly.")
+    parser.add_argument('--graph', default=None,
+                        help="Load the network from a From,To,Weight CSV or binary edge list instead of --nodes/--k.")
+    args = parser.parse_args(argv)
+
+    run(nodes=args.nodes, k=args.k, roads=args.roads, iterations=args.iterations, agent_count=args.agents,
+        mode=args.mode, seed=args.seed, workers=args.workers, output_dir=args.output, csv_export=args.csv,
+        tolerance=args.tolerance, stable_top_k=args.stable_top_k, checkpoint_path=args.checkpoint, resume=args.resume,
+        graph_path=args.graph, routing=args.routing)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Instrumentation.py
+import json
+import time
+from contextlib import contextmanager
+
+
+class SimulationMetrics:
+    """Low-overhead counters and wall-clock timers for the simulation hot paths.
+
+    Hot loops should add to counters in bulk (once per iteration or chunk) rather than per
+    agent; timers wrap whole phases.
+    """
+
+    __slots__ = ('counters', 'timers', 'calls', 'started')
+
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+        self.calls = {}
+        self.started = time.perf_counter()
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def summary(self, **extra):
+        """Plain-dict snapshot of every counter and timer, plus any extra counters given."""
+        return {
+            'elapsed_seconds': time.perf_counter() - self.started,
+            'counters': {**self.counters, **extra},
+            'timers': {name: {'seconds': seconds, 'calls': self.calls[name]} for name, seconds in self.timers.items()},
+        }
+
+    def export(self, path, **extra):
+        with open(path, 'w') as f:
+            json.dump(self.summary(**extra), f, indent=2)
+
+
+class RateLimitedReporter:
+    """Emits at most one message per interval seconds; messages are built only when emitted."""
+
+    __slots__ = ('interval', 'sink', '_last')
+
+    def __init__(self, interval=5.0, sink=print):
+        self.interval = interval
+        self.sink = sink
+        self._last = None
+
+    def maybe_report(self, message):
+        """Report message() if the interval has elapsed; message is a zero-argument callable."""
+        now = time.monotonic()
+        if self._last is None or now - self._last >= self.interval:
+            self._last = now
+            self.sink(message())
+            return True
+        return False
@@ -1,8 +1,20 @@
 # GraphInit.py
 import networkx as nx
 
+from CandidateRoads import top_candidate_roads
+from GraphIO import read_edge_list
 
-def initialize_graph(nodes=60, k=3):
-    graph = nx.random_graphs.watts_strogatz_graph(nodes, k, 0.5)
-    potential_roads = []
+
+def initialize_graph(nodes=60, k=3, candidate_limit=100, max_hops=3, seed=None):
+    # Without a seed the graph draws from the global random state.
+    graph = nx.random_graphs.watts_strogatz_graph(nodes, k, 0.5, seed=seed)
+    # Candidates come from a streaming generator, so large networks never enumerate all pairs.
+    potential_roads = top_candidate_roads(graph, limit=candidate_limit, max_hops=max_hops) if candidate_limit else []
+    return graph, potential_roads
+
+
+def load_network(path, candidate_limit=100, max_hops=3, node_type=None):
+    """Load a road network edge list (CSV or binary, see GraphIO) as a CompactGraph with candidate roads."""
+    graph = read_edge_list(path, node_type=node_type)
+    potential_roads = top_candidate_roads(graph, limit=candidate_limit, max_hops=max_hops) if candidate_limit else []
     return graph, potential_roads
@@ -0,0 +1,139 @@
+# PathCache.py
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+
+# Largest network the all-pairs path table is built for by default; it grows with n^2 times the path length.
+PATH_TABLE_LIMIT = 2000
+
+
+class ShortestPathCache:
+    """Versioned cache of per-source shortest-path trees over a CompactGraph.
+
+    Trees are keyed by node id and dropped automatically whenever the graph's version
+    changes, e.g. after a road has been added.
+    """
+
+    def __init__(self, graph, max_trees=None, max_table_nodes=PATH_TABLE_LIMIT):
+        self.graph = graph
+        n = max(graph.number_of_nodes(), 1)
+        # Small graphs keep a tree for every source (a full predecessor matrix);
+        # larger ones keep as many recently used sources as fit a fixed budget.
+        self.max_trees = max_trees if max_trees is not None else max(16, min(n, (1 << 22) // n))
+        self.max_table_nodes = max_table_nodes
+        self.hits = 0
+        self.misses = 0
+        self._trees = OrderedDict()
+        self._tree_version = graph.version
+        self._table = None
+
+    @property
+    def version(self):
+        return self.graph.version
+
+    def invalidate(self):
+        """Drop every cached tree and path table."""
+        self._trees.clear()
+        self._table = None
+
+    def share(self, other):
+        """Adopt the trees and path table of a cache over an identical copy of this graph.
+
+        Cached arrays are never modified, so both caches can hold the same objects; they
+        part ways as soon as either graph changes version.
+        """
+        if other.version != self.version or other._tree_version != other.version:
+            return
+        if self._tree_version != self.version:
+            self.invalidate()
+            self._tree_version = self.version
+        for source, tree in other._trees.items():
+            self._trees[source] = tree
+        while len(self._trees) > self.max_trees:
+            self._trees.popitem(last=False)
+        if other._table is not None and other._table[0] == other.version:
+            self._table = other._table
+
+    def tree(self, source):
+        """Return (dist, pred, pred_edge, order) of the shortest-path tree rooted at node id source."""
+        if self._tree_version != self.graph.version:
+            self.invalidate()
+            self._tree_version = self.graph.version
+
+        tree = self._trees.get(source)
+        if tree is not None:
+            self.hits += 1
+            self._trees.move_to_end(source)
+            return tree
+
+        self.misses += 1
+        tree = self.graph.shortest_path_tree(source)
+        self._trees[source] = tree
+        if len(self._trees) > self.max_trees:
+            self._trees.popitem(last=False)
+        return tree
+
+    def distance(self, source, target):
+        """Shortest path length between labels source and target, np.inf when unreachable."""
+        index = self.graph.index
+        return self.tree(index[source])[0][index[target]]
+
+    def path_ids(self, source, target):
+        """Node ids and edge ids of the shortest path between node ids source and target."""
+        _, pred, pred_edge, _ = self.tree(source)
+        if target != source and pred[target] < 0:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+
+        nodes = [target]
+        edges = []
+        while nodes[-1] != source:
+            edges.append(pred_edge[nodes[-1]])
+            nodes.append(pred[nodes[-1]])
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+    def path(self, source, target):
+        """Shortest path from label source to label target rebuilt by walking predecessors."""
+        index = self.graph.index
+        nodes = self.graph.nodes
+        return [nodes[i] for i in self.path_ids(index[source], index[target])[0]]
+
+    def set_path_table(self, table):
+        """Install a path table known to match the graph's current version, e.g. updated incrementally."""
+        self._table = (self.graph.version, table)
+
+    def path_table(self):
+        """Edge ids of every ordered pair's shortest path, as flat arrays.
+
+        Returns ``(offsets, edge_ids)`` where the path between node ids ``s`` and ``t`` is
+        ``edge_ids[offsets[s * n + t]:offsets[s * n + t + 1]]``; unreachable pairs get an
+        empty slice. Raises ValueError for graphs larger than max_table_nodes.
+        """
+        if self._table is not None and self._table[0] == self.graph.version:
+            return self._table[1]
+
+        n = self.graph.number_of_nodes()
+        if self.max_table_nodes is not None and n > self.max_table_nodes:
+            raise ValueError(f"A path table for {n} nodes would not fit in memory (limit {self.max_table_nodes}); "
+                             f"use mode='agents', or mode='batched' with routing='ch'.")
+        lengths = []
+        edge_ids = []
+        for source in range(n):
+            _, pred, pred_edge, order = self.tree(source)
+            # Each path is its predecessor's path plus one edge, so walk targets in settling order.
+            prefix = [None] * n
+            prefix[source] = []
+            for node in order[1:]:
+                prefix[node] = prefix[pred[node]] + [pred_edge[node]]
+            for path in prefix:
+                path = path or []
+                lengths.append(len(path))
+                edge_ids.extend(path)
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        table = (offsets, np.asarray(edge_ids, dtype=np.int64))
+        self._table = (self.graph.version, table)
+        return table
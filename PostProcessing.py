@@ -1,26 +1,39 @@
-import csv
+import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, ttk
 import matplotlib
-import ast
 import networkx as nx
 import numpy as np
-import pandas as pd
-import seaborn as sns
-from matplotlib import pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
+
+from BenefitEngine import BenefitEngine
+from CandidateRoads import top_candidate_roads
+from CompactGraph import CompactGraph
+from GraphIO import read_edge_list
+from GraphLayout import LayoutService
+from TrafficIO import aggregate_traffic_counts, load_traffic_counts, load_traffic_counts_csv
 
 matplotlib.use('TkAgg')
 
+# Heatmap cells are only annotated with their values up to this many cells.
+ANNOTATION_LIMIT = 300
+
 
 class SimulationAnalysis(tk.Tk):
-    def __init__(self):
+    def __init__(self, graph_structure_file="GraphEdges.csv", traffic_counts_file="TrafficCounts"):
         super().__init__()
         self.title("Traffic Simulation Analysis")
         self.geometry("1200x800")
-        self.graph_structure_file = "GraphEdges.csv"
-        self.traffic_counts_file = "TrafficCounts.csv"
+        # The graph may be a GraphEdges.csv export or a binary edge list (any other extension).
+        self.graph_structure_file = graph_structure_file
+        self.traffic_counts_file = traffic_counts_file
+        self.graph_core = None
+        # Heatmap aggregation: iterations per window (None picks it from heatmap_max_windows)
+        # and the number of busiest roads shown separately from the "other" row.
+        self.heatmap_window = None
+        self.heatmap_max_windows = 60
+        self.heatmap_top_roads = 20
+        self.rendered_tabs = set()
         self.graph_structure = self.load_graph_structure()
         self.simulation_data = self.load_and_preprocess_traffic_counts(self.traffic_counts_file)
         self.init_ui()
@@ -32,37 +45,29 @@ class SimulationAnalysis(tk.Tk):
         return filename
 
     def load_graph_structure(self):
-        G = nx.Graph()
         try:
-            with open(self.graph_structure_file, mode='r', newline='') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    G.add_edge(row['From'], row['To'], weight=float(row['Weight']))
+            self.graph_core = read_edge_list(self.graph_structure_file)
         except Exception as e:
             print(f"Failed to load graph structure: {e}")
-        return G
-
-    def load_and_preprocess_traffic_counts(self, csv_file):
-        if not csv_file:
-            raise ValueError("CSV file path must be provided")
-
-        traffic_data = []
-        with open(csv_file, mode='r', newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                iteration = int(row['iteration'])  # Ensure iteration is an integer
-                traffic_counts = ast.literal_eval(row['traffic_counts'])
-                for road, count in traffic_counts.items():
-                    road_str = f"{road[0]}-{road[1]}"  # Convert tuple to string if necessary
-                    traffic_data.append({
-                        'Iteration': iteration,
-                        'Road': road_str,
-                        'Traffic Volume': count
-                    })
-        return traffic_data
+            self.graph_core = CompactGraph()
+        return self.graph_core.to_networkx()
+
+    def load_and_preprocess_traffic_counts(self, path):
+        """Load traffic counts, memory-mapping the binary layout and falling back to the CSV export."""
+        if not path:
+            raise ValueError("Traffic counts path must be provided")
+
+        if not os.path.isdir(path) and not path.endswith('.csv') and os.path.exists(path + '.csv'):
+            path += '.csv'
+        if path.endswith('.csv'):
+            return load_traffic_counts_csv(path)
+        return load_traffic_counts(path, mmap=True)
+
+    def road_labels(self):
+        return [f"{u}-{v}" for u, v in self.simulation_data.edges.tolist()]
 
     def init_ui(self):
-        # Tabs
+        # Tabs are drawn the first time they are opened
         tab_control = ttk.Notebook(self)
         graph_tab = ttk.Frame(tab_control)
         heatmap_tab = ttk.Frame(tab_control)
@@ -72,13 +77,21 @@ class SimulationAnalysis(tk.Tk):
         benefit_button = tk.Button(self, text="Show Road Benefits", command=self.show_road_benefits)
         benefit_button.pack()
 
-        # Network Graph
-        self.visualize_graph(graph_tab)
+        self.tab_renderers = {str(graph_tab): self.visualize_graph, str(heatmap_tab): self.visualize_traffic_heatmap}
+        tab_control.bind('<<NotebookTabChanged>>', lambda event: self.render_tab(tab_control))
+        self.render_tab(tab_control)
 
-        # Traffic Heatmap
-        self.visualize_traffic_heatmap(heatmap_tab)
+    def render_tab(self, tab_control):
+        """Draw the selected tab unless it has been drawn before."""
+        tab = tab_control.select()
+        if tab and tab not in self.rendered_tabs:
+            self.rendered_tabs.add(tab)
+            self.tab_renderers[tab](self.nametowidget(tab))
 
     def visualize_graph(self, parent):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+
         fig = Figure(figsize=(8, 6))
         ax = fig.add_subplot(111)
         self.draw_network_graph(ax)
@@ -87,22 +100,37 @@ class SimulationAnalysis(tk.Tk):
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
     def draw_network_graph(self, ax):
+        from matplotlib import pyplot as plt
+
         G = self.graph_structure
-        pos = nx.spring_layout(G)
+        pos = LayoutService().positions(G)
         weights = nx.get_edge_attributes(G, 'weight').values()
         nx.draw(G, pos, ax=ax, with_labels=True, node_color='skyblue', edge_color=list(weights),
                 width=4, edge_cmap=plt.get_cmap('viridis'), node_size=500)
         ax.set_title("Network Graph")
 
     def visualize_traffic_heatmap(self, parent):
-        traffic_df = pd.DataFrame(self.simulation_data)
-        if not traffic_df.empty:
+        # pandas and seaborn are only imported once the heatmap is drawn
+        import pandas as pd
+        import seaborn as sns
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+
+        traffic = self.simulation_data
+        if traffic.counts.size:
+            window_ends, roads, matrix = aggregate_traffic_counts(
+                traffic.iterations, traffic.counts, window=self.heatmap_window,
+                max_windows=self.heatmap_max_windows, top_n=self.heatmap_top_roads)
+            road_labels = self.road_labels()
+            labels = [road_labels[road] for road in roads.tolist()]
+            if len(matrix) > len(labels):
+                labels.append("other")
             fig = Figure(figsize=(10, 4))
             ax = fig.subplots()
-            heatmap_data = traffic_df.pivot_table(index='Road', columns='Iteration', values='Traffic Volume',
-                                                  aggfunc=np.mean)
-            sns.heatmap(heatmap_data, ax=ax, cmap="Reds", annot=True, fmt=".0f")
-            ax.set_title("Traffic Volume Heatmap")
+            heatmap_data = pd.DataFrame(matrix, index=labels, columns=window_ends)
+            sns.heatmap(heatmap_data, ax=ax, cmap="Reds", annot=matrix.size <= ANNOTATION_LIMIT, fmt=".0f")
+            ax.set_title("Traffic Volume per Iteration Window")
+            ax.set_xlabel("Last iteration of window")
             canvas = FigureCanvasTkAgg(fig, master=parent)
             canvas.draw()
             canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
@@ -121,39 +149,30 @@ class SimulationAnalysis(tk.Tk):
             label.pack()
 
     def calculate_all_road_benefits(self):
-        road_benefits = {}
-        potential_roads = [(0, 2), (0, 3), (1, 2), (1, 4), (2, 3)] 
-        for road in potential_roads:
-            benefit = self.calculate_benefit(*road)
-            road_benefits[road] = benefit
-        return road_benefits
-
-    def calculate_benefit(self, x, y):
-        """Calculate the benefit of adding a road between nodes x and y."""
-        current_spdXY = self.calculate_shortest_path(x, y)
-        proposed_dXY = current_spdXY * 0.6 
-        direct_benefit = (current_spdXY - proposed_dXY) * (
-                self.nt.get((x, y), 0) + self.nt.get((y, x), 0)) 
-        indirect_benefit = 0
-        for n1, n2 in set((n1, n2) for n1 in self.graph.neighbors(y) for n2 in self.graph.neighbors(x) if n1 != n2):
-            current_spdXN1 = self.calculate_shortest_path(x, n1)
-            current_spdYN2 = self.calculate_shortest_path(y, n2)
-            indirect_path_length = current_spdXN1 + proposed_dXY + current_spdYN2
-            original_spdN1N2 = self.calculate_shortest_path(n1, n2)
-            traffic_volume_adjustment = self.nt.get((n1, n2), 0) + self.nt.get((n2, n1), 0)
-            if indirect_path_length < original_spdN1N2:
-                indirect_benefit += (original_spdN1N2 - indirect_path_length) * traffic_volume_adjustment
-
-        return direct_benefit + indirect_benefit
-
-    def calculate_shortest_path(G, source, target):
-        """Calculate the shortest path length between two nodes."""
-        try:
-            return nx.dijkstra_path_length(G, source, target, weight='weight')
-        except nx.NetworkXNoPath:
-            return np.inf
+        core = self.graph_core
+        counts = self.latest_edge_counts(core)
+        roads = top_candidate_roads(core, counts, limit=50)
+        benefits = BenefitEngine(core, factor=0.6).score(roads, counts)
+        return dict(zip(roads, benefits.tolist()))
+
+    def latest_edge_counts(self, core):
+        """Traffic counts of the last recorded iteration, indexed by the core's edge ids."""
+        counts = np.zeros(core.number_of_edges(), dtype=np.float64)
+        traffic = self.simulation_data
+        if not len(traffic.iterations):
+            return counts
+        last_counts = np.asarray(traffic.counts[-1])
+        # Compare labels as strings: the count files and CSV edge lists store them as text.
+        index = {str(label): i for i, label in enumerate(core.nodes)}
+        for (u, v), count in zip(traffic.edges.tolist(), last_counts.tolist()):
+            u, v = str(u), str(v)
+            if u in index and v in index:
+                eid = core.edge_id(index[u], index[v])
+                if eid is not None:
+                    counts[eid] = count
+        return counts
 
 
 if __name__ == "__main__":
-    app = SimulationAnalysis()
+    app = SimulationAnalysis(*sys.argv[1:3])
     app.mainloop()
@@ -18,7 +18,10 @@ nt = {edge: 0 for edge in G.edges()}
 
 
 # Method for calculating the distance between 2 nodes using dijkstra
-def CalculateShortestPath(G, source, target):
+def CalculateShortestPath(G, source, target, d=None):
+    if d is not None:
+        # d holds all-pairs distances computed once for the current graph
+        return d.get(source, {}).get(target, np.inf)
     try:
         # Find the shortest path from source to target using Dijkstra's algorithm
         path_length = nx.dijkstra_path_length(G, source=source, target=target, weight='weight')
@@ -27,8 +30,12 @@ def CalculateShortestPath(G, source, target):
     return path_length
 
 
+def AllPairsDistances(G):
+    return dict(nx.all_pairs_dijkstra_path_length(G, weight='weight'))
+
+
 def Benefit(G, X, Y, d, nt, f=0.8):
-    spdX_Y = CalculateShortestPath(G, X, Y)  # Improvement in speed variable
+    spdX_Y = CalculateShortestPath(G, X, Y, d)  # Improvement in speed variable
     dX_Y = spdX_Y * f  # Distance from X to Y
 
     # Calculate the direct benefit
@@ -40,9 +47,9 @@ def Benefit(G, X, Y, d, nt, f=0.8):
     for n1 in G.neighbors(Y):
         for n2 in G.neighbors(X):
             if (X, n1) in nt and (Y, n2) in nt:  # Adjusted to check network traffic nt
-                spdX_n1 = CalculateShortestPath(G, X, n1)
-                spdY_n2 = CalculateShortestPath(G, Y, n2)
-                dX_Y = CalculateShortestPath(G, X, Y) * f
+                spdX_n1 = CalculateShortestPath(G, X, n1, d)
+                spdY_n2 = CalculateShortestPath(G, Y, n2, d)
+                dX_Y = CalculateShortestPath(G, X, Y, d) * f
                 indirect_benefit += max(spdX_n1 + spdY_n2 - dX_Y, 0) * (nt.get((X, n1), 0) + nt.get((n2, Y), 0))
 
     total_benefit = direct_benefit + indirect_benefit
@@ -88,32 +95,32 @@ def SimulateTraffic(G, nt, potential_roads, iterations=36000, AgentCount=100):
 
 
 def evaluate_and_update_road_benefits(G, d, nt, potential_roads, k=1):
-   selected_roads = []
-
+    selected_roads = []
 
     for _ in range(k):
-       road_benefits = []
-       for road in potential_roads:
-           X, Y = road
-           benefit = Benefit(G, X, Y, d, nt, f=0.8)
-           road_benefits.append((road, benefit))
-       road_benefits.sort(key=lambda  x: x[1], reverse=True)
-
-       if not road_benefits:
-           break # No more roads to evaluate, so just break
+        # Distances only change when a road is added, so share them across this round
+        d = AllPairsDistances(G)
+        road_benefits = []
+        for road in potential_roads:
+            X, Y = road
+            benefit = Benefit(G, X, Y, d, nt, f=0.8)
+            road_benefits.append((road, benefit))
+        road_benefits.sort(key=lambda x: x[1], reverse=True)
+
+        if not road_benefits:
+            break  # No more roads to evaluate, so just break
 
         # select the road with the highest benefit
+        best_road, best_benefit = road_benefits[0]
+        selected_roads.append((best_road, best_benefit))
 
-       best_road, best_benefit = road_benefits[0]
-       selected_roads.append((best_road, best_benefit))
-
-       # Add the best road to the graph
-       G.add_edge(*best_road, weight=best_benefit)
+        # Add the best road to the graph
+        G.add_edge(*best_road, weight=best_benefit)
 
-       # Remove the added road from the list of potential roads
-       potential_roads.remove(best_road)
-       nt = {edge: 0 for edge in G.edges()}
-       for _ in SimulateTraffic(G, nt, potential_roads, iterations=36000, AgentCount= 100):
-        pass
+        # Remove the added road from the list of potential roads
+        potential_roads.remove(best_road)
+        nt = {edge: 0 for edge in G.edges()}
+        for _ in SimulateTraffic(G, nt, potential_roads, iterations=36000, AgentCount=100):
+            pass
 
     return selected_roads
@@ -0,0 +1,65 @@
+# RoadPlanner.py
+from heapq import heappop, heappush
+
+import numpy as np
+
+
+def lazy_greedy(count, k, score, commit, batch=16):
+    """Pick k candidates greedily (CELF), re-evaluating only those that could still win.
+
+    ``score(indices)`` returns ``(benefits, bounds)`` for the current state, where each bound
+    stays an upper bound of that candidate's benefit in every later round. ``commit(index,
+    benefit)`` applies a pick and returns the indices whose bounds it invalidated. Returns
+    ``[(index, benefit)]`` in pick order, with ties going to the lowest index exactly like a
+    stable descending sort of all benefits every round. Up to ``batch`` stale candidates from
+    the top of the queue are re-scored together.
+    """
+    if count == 0 or k <= 0:
+        return []
+
+    benefits, upper = score(np.arange(count))
+    upper = upper.copy()
+    token = [0] * count
+    # Entries are (-key, index, round the key is exact for or -1, token); outdated tokens are skipped.
+    heap = [(-benefit, index, 0, 0) for index, benefit in enumerate(benefits.tolist())]
+    heap.sort()
+    exact = set(range(count))
+    removed = set()
+    picked = []
+
+    for round_number in range(k):
+        pick = None
+        while heap:
+            key, index, stamp, entry_token = heappop(heap)
+            if index in removed or entry_token != token[index]:
+                continue
+            if stamp == round_number:
+                pick = (index, -key)
+                break
+            # Only a bound so far: evaluate exactly against the current graph and push back,
+            # together with the next few stale candidates in line.
+            stale = [index]
+            while heap and len(stale) < batch and heap[0][2] != round_number:
+                _, index, _, entry_token = heappop(heap)
+                if index not in removed and entry_token == token[index]:
+                    stale.append(index)
+            benefits, bounds = score(np.array(stale))
+            for index, benefit, bound in zip(stale, benefits.tolist(), bounds.tolist()):
+                upper[index] = bound
+                token[index] += 1
+                exact.add(index)
+                heappush(heap, (-benefit, index, round_number, token[index]))
+        if pick is None:
+            break
+
+        picked.append(pick)
+        removed.add(pick[0])
+        invalid = set(commit(*pick))
+        # Exact keys only hold for this round; later rounds start from the bounds again.
+        for index in (exact | invalid) - removed:
+            token[index] += 1
+            key = np.inf if index in invalid else upper[index]
+            heappush(heap, (-key, index, -1, token[index]))
+        exact = set()
+
+    return picked
@@ -0,0 +1,251 @@
+# ScenarioSweep.py
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import tqdm
+
+from SimulationLogic import SIMULATION_MODES
+
+# Every scenario sets all of these; a grid lists one or more values per field.
+SCENARIO_DEFAULTS = {
+    'nodes': 60, 'k': 3, 'graph_seed': 0, 'iterations': 36000, 'agent_count': 100, 'mode': 'batched',
+    'seed': 0, 'road_factor': 0.6, 'roads': 1,
+}
+# Scenarios agreeing on these share one graph, its candidate roads and its shortest-path trees.
+GRAPH_FIELDS = ('nodes', 'k', 'graph_seed')
+# Scenarios agreeing on these (and on the graph) also share one traffic assignment.
+TRAFFIC_FIELDS = ('iterations', 'agent_count', 'mode', 'seed')
+
+_COLUMNS = {
+    'nodes': 'INTEGER', 'k': 'INTEGER', 'graph_seed': 'INTEGER', 'iterations': 'INTEGER',
+    'agent_count': 'INTEGER', 'mode': 'TEXT', 'seed': 'INTEGER', 'road_factor': 'REAL', 'roads': 'INTEGER',
+    'status': 'TEXT', 'edges': 'INTEGER', 'completed_iterations': 'INTEGER', 'total_traffic': 'INTEGER',
+    'seconds': 'REAL', 'precompute_seconds': 'REAL', 'selected_roads': 'TEXT', 'counts': 'BLOB',
+    'error': 'TEXT', 'finished_at': 'REAL',
+}
+
+
+def expand_grid(grid):
+    """Every scenario of a parameter grid, as dicts covering all SCENARIO_DEFAULTS fields.
+
+    Grid values may be single values or lists; missing fields take their default.
+    """
+    unknown = set(grid) - set(SCENARIO_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown scenario parameters {sorted(unknown)}, expected {list(SCENARIO_DEFAULTS)}")
+    axes = []
+    for field, default in SCENARIO_DEFAULTS.items():
+        values = grid.get(field, default)
+        axes.append(list(values) if isinstance(values, (list, tuple)) else [values])
+    for mode in axes[list(SCENARIO_DEFAULTS).index('mode')]:
+        if mode not in SIMULATION_MODES:
+            raise ValueError(f"Unknown simulation mode {mode!r}, expected one of {SIMULATION_MODES}")
+    return [dict(zip(SCENARIO_DEFAULTS, values)) for values in itertools.product(*axes)]
+
+
+def scenario_key(scenario):
+    """Stable text key of a scenario, the primary key of its record."""
+    return json.dumps({field: scenario[field] for field in SCENARIO_DEFAULTS}, sort_keys=True)
+
+
+def _run_graph_group(graph_params, scenarios, candidate_limit):
+    """Worker entry point: run every scenario of one graph, sharing all per-graph work.
+
+    The graph, its candidate roads and its shortest-path trees and path table are built once.
+    Each scenario then simulates on its own copy of the graph, so selected roads never leak
+    between scenarios, and scenarios that differ only in road_factor or roads reuse one
+    traffic assignment.
+    """
+    from CompactGraph import CompactGraph
+    from LargerNetwork import initialize_graph
+    from PathCache import PATH_TABLE_LIMIT, ShortestPathCache
+    from SimulationLogic import TrafficSimulation
+    from TrafficIO import road_details_json
+
+    started = time.perf_counter()
+    graph, candidates = initialize_graph(nodes=graph_params['nodes'], k=graph_params['k'],
+                                         candidate_limit=candidate_limit, seed=graph_params['graph_seed'])
+    base = CompactGraph.from_networkx(graph)
+    base_cache = ShortestPathCache(base)
+    if 2 <= base.number_of_nodes() <= PATH_TABLE_LIMIT:
+        base_cache.path_table()
+    precompute_seconds = time.perf_counter() - started
+
+    assignments = {}
+    records = []
+    for scenario in scenarios:
+        started = time.perf_counter()
+        record = {'key': scenario_key(scenario), **scenario, 'precompute_seconds': precompute_seconds}
+        try:
+            simulation = TrafficSimulation(base.copy(), candidates, iterations=scenario['iterations'],
+                                           agent_count=scenario['agent_count'], mode=scenario['mode'],
+                                           seed=scenario['seed'], workers=1, output_dir=None,
+                                           road_factor=scenario['road_factor'])
+            simulation.path_cache.share(base_cache)
+            # Unseeded scenarios draw fresh traffic each time, so only seeded ones are shared.
+            traffic_key = tuple(scenario[field] for field in TRAFFIC_FIELDS) if scenario['seed'] is not None else None
+            if traffic_key in assignments:
+                counts, costs, completed = assignments[traffic_key]
+                simulation.nt.array[:] = counts
+                simulation.benefit_engine.set_costs(costs)
+                simulation.completed_iterations = completed
+            else:
+                if scenario['seed'] is not None:
+                    random.seed(scenario['seed'])  # agents mode draws from the global random state
+                for _ in simulation.simulate_traffic():
+                    pass
+                if traffic_key is not None:
+                    assignments[traffic_key] = (simulation.nt.array.copy(), simulation.benefit_engine.costs,
+                                                simulation.completed_iterations)
+            counts = simulation.nt.array.copy()
+            selected = simulation.evaluate_and_update_road_benefits(k=scenario['roads']) if candidates else []
+            record.update({
+                'status': 'done',
+                'edges': graph.number_of_edges(),
+                'completed_iterations': simulation.completed_iterations,
+                'total_traffic': int(counts.sum()),
+                'selected_roads': [road_details_json(detail) for detail in selected],
+                'counts': counts,
+            })
+        except Exception:
+            record.update({'status': 'failed', 'error': traceback.format_exc()})
+        record['seconds'] = time.perf_counter() - started
+        record['finished_at'] = time.time()
+        records.append(record)
+    return records
+
+
+class ResultStore:
+    """SQLite file holding one record per scenario, keyed by scenario_key.
+
+    Scenario parameters are plain indexed columns, selected roads are stored as JSON and the
+    final per-edge-id traffic counts as an int64 blob. Re-running a scenario replaces its record.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        columns = ', '.join(f"{name} {kind}" for name, kind in _COLUMNS.items())
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS scenarios (key TEXT PRIMARY KEY, {columns})")
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS scenarios_graph ON scenarios ({', '.join(GRAPH_FIELDS)})")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS scenarios_parameters ON scenarios (agent_count, road_factor, roads)")
+
+    def close(self):
+        self.connection.close()
+
+    def finished(self):
+        """Keys of every scenario that completed successfully."""
+        return {key for key, in self.connection.execute("SELECT key FROM scenarios WHERE status = 'done'")}
+
+    def save(self, record):
+        row = {name: record.get(name) for name in _COLUMNS}
+        if row['selected_roads'] is not None:
+            row['selected_roads'] = json.dumps(row['selected_roads'])
+        if row['counts'] is not None:
+            row['counts'] = np.asarray(row['counts'], dtype=np.int64).tobytes()
+        names = ['key', *row]
+        with self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO scenarios ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                [record['key'], *row.values()])
+
+    def records(self, **filters):
+        """Stored records as dicts, optionally filtered by column values, e.g. nodes=60."""
+        unknown = set(filters) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot filter on {sorted(unknown)}")
+        where = ' AND '.join(f"{name} = ?" for name in filters)
+        cursor = self.connection.execute(f"SELECT * FROM scenarios{' WHERE ' + where if where else ''} ORDER BY key",
+                                         list(filters.values()))
+        names = [column[0] for column in cursor.description]
+        records = []
+        for row in cursor:
+            record = dict(zip(names, row))
+            if record['selected_roads'] is not None:
+                record['selected_roads'] = json.loads(record['selected_roads'])
+            if record['counts'] is not None:
+                record['counts'] = np.frombuffer(record['counts'], dtype=np.int64)
+            records.append(record)
+        return records
+
+
+def run_sweep(grid, store_path='sweep.sqlite', workers=None, candidate_limit=100, rerun=False):
+    """Run every scenario of grid on a process pool and store one record per scenario.
+
+    Scenarios are grouped by graph and each group runs in one task, so per-graph work is done
+    once per group. Scenarios already stored as done are skipped unless rerun is set, which
+    lets an interrupted sweep pick up where it stopped. Returns the number of scenarios run.
+    """
+    scenarios = expand_grid(grid)
+    store = ResultStore(store_path)
+    try:
+        done = set() if rerun else store.finished()
+        groups = {}
+        for scenario in scenarios:
+            if scenario_key(scenario) not in done:
+                groups.setdefault(tuple(scenario[field] for field in GRAPH_FIELDS), []).append(scenario)
+        pending = sum(len(group) for group in groups.values())
+        print(f"{pending} of {len(scenarios)} scenarios to run on {len(groups)} graphs.")
+        if not groups:
+            return 0
+
+        context = multiprocessing.get_context('spawn')
+        failed = 0
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count(), len(groups)), mp_context=context) as pool:
+            futures = [pool.submit(_run_graph_group, dict(zip(GRAPH_FIELDS, key)), group, candidate_limit)
+                       for key, group in groups.items()]
+            with tqdm.tqdm(total=pending, desc="Running Scenarios") as progress:
+                for future in as_completed(futures):
+                    for record in future.result():
+                        store.save(record)
+                        failed += record['status'] != 'done'
+                        progress.update(1)
+    finally:
+        store.close()
+    if failed:
+        print(f"{failed} scenarios failed; see the error column of their records.")
+    print(f"Sweep results saved successfully to {os.path.abspath(store_path)}.")
+    return pending
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a grid of traffic simulation scenarios on a process pool.")
+    parser.add_argument('--nodes', type=int, nargs='+', default=[SCENARIO_DEFAULTS['nodes']])
+    parser.add_argument('--k', type=int, nargs='+', default=[SCENARIO_DEFAULTS['k']],
+                        help="Nearest neighbors of the Watts-Strogatz graph.")
+    parser.add_argument('--graph-seeds', type=int, nargs='+', default=[SCENARIO_DEFAULTS['graph_seed']])
+    parser.add_argument('--iterations', type=int, nargs='+', default=[SCENARIO_DEFAULTS['iterations']])
+    parser.add_argument('--agents', type=int, nargs='+', default=[SCENARIO_DEFAULTS['agent_count']])
+    parser.add_argument('--mode', choices=SIMULATION_MODES, nargs='+', default=[SCENARIO_DEFAULTS['mode']])
+    parser.add_argument('--seeds', type=int, nargs='+', default=[SCENARIO_DEFAULTS['seed']],
+                        help="Traffic seeds of the simulation.")
+    parser.add_argument('--road-factors', type=float, nargs='+', default=[SCENARIO_DEFAULTS['road_factor']],
+                        help="Proposed road length relative to the current shortest path.")
+    parser.add_argument('--roads', type=int, nargs='+', default=[SCENARIO_DEFAULTS['roads']],
+                        help="Number of roads to select.")
+    parser.add_argument('--candidates', type=int, default=100, help="Candidate roads per graph.")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--store', default='sweep.sqlite', help="SQLite file receiving one record per scenario.")
+    parser.add_argument('--rerun', action='store_true', help="Also rerun scenarios already stored as done.")
+    args = parser.parse_args(argv)
+
+    grid = {'nodes': args.nodes, 'k': args.k, 'graph_seed': args.graph_seeds, 'iterations': args.iterations,
+            'agent_count': args.agents, 'mode': args.mode, 'seed': args.seeds, 'road_factor': args.road_factors,
+            'roads': args.roads}
+    run_sweep(grid, store_path=args.store, workers=args.workers, candidate_limit=args.candidates, rerun=args.rerun)
+
+
+if __name__ == "__main__":
+    main()
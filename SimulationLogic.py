@@ -1,16 +1,54 @@
-import csv
+import os
 import random
 
-import networkx as nx
 import numpy as np
 import tqdm
 
+from Assignment import (assign_pairs, improved_pairs, pair_trip_counts, reassign_new_edge, run_sharded, sample_pairs,
+                        tree_loads)
+from BenefitEngine import BenefitEngine
+from Checkpoint import CheckpointWriter, read_checkpoint, write_checkpoint
+from CompactGraph import CompactGraph
+from ContractionHierarchy import ContractionHierarchy, FillBudgetExceeded
+from EdgeCounts import EdgeCountView
+from Equilibrium import EquilibriumAssignment
+from GraphIO import write_edge_list
+from Instrumentation import RateLimitedReporter, SimulationMetrics
+from PathCache import ShortestPathCache
+from RoadPlanner import lazy_greedy
+from SnapshotStore import SnapshotStore
+from TrafficIO import save_traffic_counts, save_traffic_counts_csv
+
+SIMULATION_MODES = ('agents', 'batched', 'parallel', 'analytic', 'equilibrium')
+# Point-to-point routing: cached Dijkstra trees, or a contraction hierarchy for large near-planar road networks.
+ROUTING_BACKENDS = ('tree', 'ch')
+# Largest network whose sampled modes keep the dense n x n trips per OD pair by default.
+PAIR_TRACKING_LIMIT = 2000
+
 
 class TrafficSimulation:
-    def __init__(self, graph, potential_roads, iterations=36000, agent_count=100, update_interval=500):
-        self.G = graph
-        self.graph_original = graph.copy()
-        self.graph = graph.copy()
+    def __init__(self, graph, potential_roads, iterations=36000, agent_count=100, update_interval=500,
+                 mode='agents', batch_size=None, seed=None, workers=None, snapshot_interval=None,
+                 snapshot_capacity=1024, csv_export=False, output_dir='.', metrics_path=None, report_interval=5.0,
+                 convergence=None, capacity=None, equilibrium_method='frank-wolfe', checkpoint_path=None,
+                 checkpoint_interval=None, road_factor=0.6, demand=None, routing='tree', track_pairs=None):
+        if mode not in SIMULATION_MODES:
+            raise ValueError(f"Unknown simulation mode {mode!r}, expected one of {SIMULATION_MODES}")
+        if routing not in ROUTING_BACKENDS:
+            raise ValueError(f"Unknown routing backend {routing!r}, expected one of {ROUTING_BACKENDS}")
+        if routing == 'ch' and mode == 'parallel':
+            raise ValueError("Parallel mode routes over an all-pairs path table; use batched mode with routing='ch'.")
+        # Hot paths run on the compact core; networkx is only built at the API boundary.
+        # A CompactGraph may also be passed directly, keeping its exact edge ids, and then
+        # G is only converted to networkx when something asks for it.
+        if isinstance(graph, CompactGraph):
+            self.core = graph
+            self._G = None
+        else:
+            self.core = CompactGraph.from_networkx(graph)
+            self._G = graph
+        # The network before any selected road, as a CompactGraph.
+        self.original_core = self.core.copy()
         self.initial_potential_roads = potential_roads.copy()
         self.potential_roads = potential_roads.copy()
         self.selected_roads = []
@@ -18,134 +56,694 @@ class TrafficSimulation:
 
         self.iterations = iterations
         self.agent_count = agent_count
-        self.traffic_data_per_iteration = []
         self.update_interval = update_interval
-        self.nt = {edge: 0 for edge in self.graph.edges()}
-        self.traffic_data_per_iteration = []
+        self.mode = mode
+        self.batch_size = batch_size
+        self.seed = seed
+        # Optional ConvergenceMonitor that may end a run before all iterations are routed.
+        self.convergence = convergence
+        self.completed_iterations = 0
+        # Iteration the next simulate_traffic call starts from; set when resuming a checkpoint.
+        self.start_iteration = 0
+        # Periodic checkpoints, written off the hot loop (every 10 update intervals by default).
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval or 10 * update_interval
+        self.snapshot_capacity = snapshot_capacity
+        self._checkpoint_writer = None
+        self._next_checkpoint = None
+        # Equilibrium mode: BPR road capacity (scalar or per edge id) and the solver used.
+        self.capacity = capacity
+        self.equilibrium_method = equilibrium_method
+        self.equilibrium = None
+        self.workers = workers or os.cpu_count()
+        # Optional OD demand model (Demand.py); trips are drawn uniformly over node pairs without one.
+        self.demand_model = demand
+        self.demand = demand.bind(self.core) if demand is not None else None
+        self.rng = np.random.default_rng(seed)
+        # Trips routed per ordered (start, end) node-id pair by the sampled modes, which
+        # commit_road needs to move traffic; analytic mode knows them without tracking.
+        n = self.core.number_of_nodes()
+        if track_pairs is None:
+            track_pairs = n <= PAIR_TRACKING_LIMIT
+        self.track_pairs = track_pairs and mode in ('agents', 'batched', 'parallel')
+        self.pair_trips = np.zeros((n, n), dtype=np.int64) if self.track_pairs else None
+        # With routing='ch', commit_road reroutes along the hierarchy that loaded the traffic,
+        # frozen at the first commit, and remembers the paths it moved pairs to.
+        self._loaded_version = None
+        self._loaded_router = None
+        self._loaded_iterations = None
+        self._routed_paths = {}
+        # Edge slots of nt are the core's canonical edge ids.
+        self.nt = EdgeCountView(self.core.edges())
+        self.snapshots = SnapshotStore(len(self.nt), interval=snapshot_interval or update_interval,
+                                       capacity=snapshot_capacity)
         self.simulation_data = []
+        self.csv_export = csv_export
+        self.output_dir = output_dir
+        self.metrics = SimulationMetrics()
+        self.metrics_path = metrics_path
+        self.reporter = RateLimitedReporter(report_interval)
+        self.path_cache = ShortestPathCache(self.core)
+        # Answers the point-to-point queries (agents, batched mode, path lookups); all-pairs
+        # work such as benefits and the analytic modes keeps using the tree cache.
+        self.routing = routing
+        self.router = self.path_cache
+        if routing == 'ch':
+            try:
+                self.router = ContractionHierarchy(self.core)
+            except FillBudgetExceeded as e:
+                print(f"{e} Falling back to routing='tree'.")
+                self.routing = 'tree'
+        if mode == 'parallel' or (mode == 'batched' and self.routing == 'tree'):
+            n = self.core.number_of_nodes()
+            if n > self.path_cache.max_table_nodes:
+                raise ValueError(f"{mode.capitalize()} mode routes over an all-pairs path table, which is limited to "
+                                 f"{self.path_cache.max_table_nodes} nodes ({n} given); use mode='agents', "
+                                 f"or mode='batched' with routing='ch'.")
+        # Length of a proposed road relative to the current shortest path, used when scoring
+        # benefits and as the weight of the roads that get selected.
+        self.road_factor = road_factor
+        self.benefit_engine = BenefitEngine(self.core, self.path_cache, factor=road_factor)
+
+    @property
+    def G(self):
+        """The network before any selected road, as networkx."""
+        if self._G is None:
+            self._G = self.original_core.to_networkx()
+        return self._G
+
+    @property
+    def graph_original(self):
+        return self.G
+
+    @property
+    def graph(self):
+        """The simulated graph, including selected roads, as networkx."""
+        return self.core.to_networkx()
+
+    def add_road(self, u, v, weight):
+        """Add a road to the simulated graph; cached shortest paths follow the graph version."""
+        eid = self.core.add_edge(u, v, weight)
+        if eid == len(self.nt):
+            self.nt.add_edge((u, v))
+            self.snapshots.add_edges(len(self.nt))
+        return eid
+
+    def road_traffic(self, u, v):
+        """Traffic count on the road between node ids u and v, 0 if there is none."""
+        eid = self.core.edge_id(u, v)
+        return 0 if eid is None else int(self.nt.counts[eid])
+
+    def metrics_summary(self):
+        """Counters and timers collected so far, including shortest-path cache statistics."""
+        return self.metrics.summary(cache_hits=self.router.hits, cache_misses=self.router.misses)
 
     def calculate_shortest_path(self, source, target):
         """Calculate the shortest path length between two nodes."""
-        try:
-            return nx.dijkstra_path_length(self.graph, source, target, weight='weight')
-        except nx.NetworkXNoPath:
-            return np.inf
+        self.metrics.count('shortest_path_queries')
+        return self.router.distance(source, target)
 
     def benefit(self, x, y):
         """Calculate the benefit of adding a road between nodes x and y."""
-        current_spdXY = self.calculate_shortest_path(x, y)
-        proposed_dXY = current_spdXY * 0.6  # Adjusted road length to simulate new road
-        direct_benefit = (current_spdXY - proposed_dXY) * (
-                    self.nt.get((x, y), 0) + self.nt.get((y, x), 0))  
+        self.metrics.count('benefit_evaluations')
+        x, y = self.core.index[x], self.core.index[y]
+        dist_x = self.path_cache.tree(x)[0]
+        dist_y = self.path_cache.tree(y)[0]
+        current_spdXY = dist_x[y]
+        proposed_dXY = current_spdXY * self.road_factor  # Adjusted road length to simulate new road
+        direct_benefit = (current_spdXY - proposed_dXY) * self.road_traffic(x, y)
 
         indirect_benefit = 0
-        for n1, n2 in set((n1, n2) for n1 in self.graph.neighbors(y) for n2 in self.graph.neighbors(x) if n1 != n2):
-            current_spdXN1 = self.calculate_shortest_path(x, n1)
-            current_spdYN2 = self.calculate_shortest_path(y, n2)
-            indirect_path_length = current_spdXN1 + proposed_dXY + current_spdYN2
-            original_spdN1N2 = self.calculate_shortest_path(n1, n2)
-            traffic_volume_adjustment = self.nt.get((n1, n2), 0) + self.nt.get((n2, n1), 0)
-            if indirect_path_length < original_spdN1N2:
-                indirect_benefit += (original_spdN1N2 - indirect_path_length) * traffic_volume_adjustment
+        neighbors_x = self.core.neighbors(x).tolist()
+        for n1 in self.core.neighbors(y).tolist():
+            original_spdN1 = self.path_cache.tree(n1)[0]
+            for n2 in neighbors_x:
+                if n1 == n2:
+                    continue
+                current_spdXN1 = dist_x[n1]
+                current_spdYN2 = dist_y[n2]
+                indirect_path_length = current_spdXN1 + proposed_dXY + current_spdYN2
+                original_spdN1N2 = original_spdN1[n2]
+                traffic_volume_adjustment = self.road_traffic(n1, n2)
+                if indirect_path_length < original_spdN1N2:
+                    indirect_benefit += (original_spdN1N2 - indirect_path_length) * traffic_volume_adjustment
 
         return direct_benefit + indirect_benefit
 
+    def score_roads(self, roads):
+        """Benefit of every road in roads, scored in one pass over the shared distance matrix."""
+        self.metrics.count('benefit_evaluations', len(roads))
+        with self.metrics.timer('benefit'):
+            return self.benefit_engine.score(roads, self.nt.array)
+
     def simulate_traffic(self, callback=None):
         """Simulate traffic to update nt with new traffic counts."""
+        self.completed_iterations = self.start_iteration
+        self.start_iteration = 0
+        if self.convergence is not None:
+            self.convergence.reset()
+        if self.checkpoint_path:
+            self._checkpoint_writer = self._checkpoint_writer or CheckpointWriter(self.checkpoint_path)
+            self._next_checkpoint = self.completed_iterations + self.checkpoint_interval
+        try:
+            if self.completed_iterations >= self.iterations > 0:
+                pass  # resumed from a checkpoint of a finished run
+            elif self.mode == 'batched':
+                yield from self._simulate_batched(callback)
+            elif self.mode == 'parallel':
+                yield from self._simulate_parallel(callback)
+            elif self.mode == 'analytic':
+                yield from self._simulate_analytic(callback)
+            elif self.mode == 'equilibrium':
+                yield from self._simulate_equilibrium(callback)
+            else:
+                self._simulate_agents(callback)
+        finally:
+            self._loaded_version = self.core.version
+            # Interrupted runs still leave their last checkpoint complete on disk.
+            if self._checkpoint_writer is not None:
+                self._checkpoint_writer.flush()
+
+        if self.completed_iterations:
+            self.snapshots.record(self.completed_iterations - 1, self.nt.array)
+        if self.checkpoint_path:
+            self.save_checkpoint(self.checkpoint_path)
+        if self.output_dir is not None:  # output_dir=None keeps the results in memory only
+            with self.metrics.timer('io'):
+                self.save_graph_edges_to_csv()
+                self.save_traffic_counts()
+                if self.csv_export:
+                    self.save_traffic_counts_to_csv()
+        summary = self.metrics_summary()
+        if self.metrics_path:
+            self.metrics.export(self.metrics_path, cache_hits=self.router.hits, cache_misses=self.router.misses)
+        if callback:
+            callback(trafficData=self.nt, metrics=summary)
+        update = {"progress": self.completed_iterations, "total_iterations": self.iterations,
+                  "message": f"Simulation complete: {self.completed_iterations} iterations", "metrics": summary}
+        if self.convergence is not None:
+            update["error_bound"] = self.convergence.error_bound
+        yield update
+
+    def _report(self, iteration):
+        """Rate-limited progress line with a sample of the current counts."""
+        self.reporter.maybe_report(
+            lambda: f"Sample traffic counts after iteration {iteration}: {dict(list(self.nt.items())[:5])}")
+
+    def _simulate_agents(self, callback=None):
+        """Route agents one at a time through the shortest-path cache."""
         start, end = None, None
+        nodes = self.core.nodes
+        counts = self.nt.counts
+        if len(nodes) < 2:
+            print("Not enough nodes in the graph to start the simulation.")
+            return
 
-        for iteration in tqdm.tqdm(range(self.iterations), desc="Simulating Traffic"):
-            for _ in range(self.agent_count):
-                if len(self.graph.nodes()) >= 2:
-                    # Proceed with simulation
-                    start, end = random.sample(list(self.graph.nodes()), 2)
-                    path = nx.shortest_path(self.graph, source=start, target=end, weight='weight')
-
-                    for i in range(len(path) - 1):
-                        edge = (path[i], path[i + 1])
-                        if edge in self.nt:
-                            self.nt[edge] += 1
-                        elif (edge[1], edge[0]) in self.nt:
-                            self.nt[(edge[1], edge[0])] += 1
-                     # Select a random potential road to evaluate
-                    potential_road = random.choice(self.potential_roads)
-                        else:
-                            print(f"Edge not found in nt: {edge}")
-
-                    # After each iteration append and store data for post-processing
-                    print(f"Sample traffic counts after iteration {iteration}: {dict(list(self.nt.items())[:5])}")
-                    self.traffic_data_per_iteration.append(self.nt.copy())
-
-                    # store for post-processing
-                    traffic_snapshot = {"iteration": iteration, "traffic_counts": dict(list(self.nt.items())[:5])}
-                    self.simulation_data.append(traffic_snapshot)
+        batch_start = self.nt.array.copy()
+        for iteration in tqdm.tqdm(range(self.completed_iterations, self.iterations), desc="Simulating Traffic",
+                                   initial=self.completed_iterations, total=self.iterations):
+            incremented = 0
+            with self.metrics.timer('routing'):
+                if self.demand is None:
+                    pairs = (random.sample(range(len(nodes)), 2) for _ in range(self.agent_count))
                 else:
-                    print("Not enough nodes in the graph to start the simulation.")
-                    pass
+                    pairs = zip(*(ids.tolist() for ids in self.demand.sample(self.rng, self.agent_count)))
+                for start, end in pairs:
+                    if self.pair_trips is not None:
+                        self.pair_trips[start, end] += 1
+                    path_edges = self.router.path_ids(start, end)[1]
+                    for edge in path_edges:
+                        counts[edge] += 1
+                    incremented += len(path_edges)
+            self.metrics.count('shortest_path_queries', self.agent_count)
+            self.metrics.count('agents_routed', self.agent_count)
+            self.metrics.count('edges_incremented', incremented)
+            self.completed_iterations = iteration + 1
+
+            # store sampled counts for post-processing
+            with self.metrics.timer('snapshots'):
+                self.snapshots.maybe_record(iteration, self.nt.array)
+            self._report(iteration)
 
             if callback and iteration % self.update_interval == 0 and start is not None and end is not None:
-                callback(currentPath=[(start, end)], trafficData=self.nt)
+                callback(currentPath=[(nodes[start], nodes[end])], trafficData=self.nt,
+                         metrics=self.metrics_summary())
 
-        if callback:
-            callback(trafficData=self.nt)
-        self.save_graph_edges_to_csv()
-        self.save_traffic_counts_to_csv()
-        yield {"progress": self.iterations, "total_iterations": self.iterations,
-               "message": "Simulation complete: {self.iterations} iterations"}
-
-    def evaluate_and_update_road_benefits(self, k=1):
-        """Evaluate potential roads for benefits, select and update the graph with the best k roads."""
-        road_benefits = [(road, self.benefit(*road)) for road in self.potential_roads if
-                         road not in self.selected_roads]
+            self._maybe_checkpoint()
+
+            # Batches for the stopping rule are update_interval iterations long.
+            if self.convergence is not None and (iteration + 1) % self.update_interval == 0:
+                self._check_convergence(self.nt.array - batch_start)
+                batch_start = self.nt.array.copy()
+                if self.convergence.converged:
+                    break
+
+    def _simulate_batched(self, callback=None):
+        """Route whole chunks of iterations at once through the precomputed path table."""
+        nodes = self.core.nodes
+        n = len(nodes)
+        if n < 2:
+            print("Not enough nodes in the graph to start the simulation.")
+            return
+
+        if self.routing == 'tree':
+            with self.metrics.timer('path_table'):
+                offsets, edge_ids = self.path_cache.path_table()
+        chunks = [(first, last) for first, last in self._chunks() if first >= self.completed_iterations]
+        for first, last in tqdm.tqdm(chunks, desc="Simulating Traffic"):
+            with self.metrics.timer('routing'):
+                starts, ends = self._sample_pairs((last - first) * self.agent_count)
+                if self.routing == 'tree':
+                    loads = assign_pairs(starts, ends, n, offsets, edge_ids, len(self.nt))
+                else:
+                    loads = self.router.assign(starts, ends, len(self.nt))
+            if self.pair_trips is not None:
+                self._add_pair_trips(pair_trip_counts(starts, ends, n))
+            yield self._merge_chunk(first, last, loads, (starts[-1], ends[-1]), callback)
+            if self.convergence is not None and self.convergence.converged:
+                break
+
+    def _simulate_parallel(self, callback=None):
+        """Route chunks of iterations on a process pool, each chunk with its own seeded stream."""
+        nodes = self.core.nodes
+        n = len(nodes)
+        if n < 2:
+            print("Not enough nodes in the graph to start the simulation.")
+            return
+
+        with self.metrics.timer('path_table'):
+            offsets, edge_ids = self.path_cache.path_table()
+        chunks = self._chunks()
+        chunk_trips = [(last - first) * self.agent_count for first, last in chunks]
+        done = sum(1 for _, last in chunks if last <= self.completed_iterations)
+        if self.seed is None:
+            # Fix the entropy so that checkpoints can replay the same chunk streams.
+            self.seed = np.random.SeedSequence().entropy
+        shards = run_sharded(n, offsets, edge_ids, len(self.nt), chunk_trips, seed=self.seed, workers=self.workers,
+                             first_chunk=done, demand=self.demand, track_pairs=self.pair_trips is not None)
+        for chunk, loads, last_pair, pairs in tqdm.tqdm(shards, initial=done, total=len(chunks),
+                                                        desc="Simulating Traffic"):
+            first, last = chunks[chunk]
+            if pairs is not None:
+                self._add_pair_trips(pairs)
+            yield self._merge_chunk(first, last, loads, last_pair, callback)
+            if self.convergence is not None and self.convergence.converged:
+                # Closing the generator cancels the chunks still queued on the pool.
+                shards.close()
+                break
+
+    def _simulate_analytic(self, callback=None):
+        """Fill nt with the expected counts of the Monte Carlo modes instead of sampling them.
+
+        Agents pick uniform ordered pairs, so every reachable pair expects
+        ``iterations * agent_count / (n * (n - 1))`` trips along its path, or that many trips
+        times the pair's share under a demand model. Pairs follow the
+        cached shortest-path trees, which break equal-cost ties exactly as the sampling
+        modes do, so a long Monte Carlo run converges to these counts.
+        """
+        nodes = self.core.nodes
+        n = len(nodes)
+        if n < 2:
+            print("Not enough nodes in the graph to start the simulation.")
+            return
+
+        with self.metrics.timer('routing'):
+            if self.demand is None:
+                loads = np.zeros(len(self.nt), dtype=np.int64)
+                for source in tqdm.tqdm(range(n), desc="Assigning Expected Traffic"):
+                    loads += tree_loads(self.path_cache.tree(source), len(self.nt))
+                scale = self.iterations * self.agent_count / (n * (n - 1))
+            else:
+                loads = np.zeros(len(self.nt), dtype=np.float64)
+                for source in tqdm.tqdm(self.demand.origins.tolist(), desc="Assigning Expected Traffic"):
+                    loads += tree_loads(self.path_cache.tree(source), len(self.nt), self.demand.shares_from(source))
+                scale = self.iterations * self.agent_count
+        yield self._merge_chunk(0, self.iterations, np.rint(loads * scale).astype(np.int64), (0, n - 1), callback,
+                                sampled=False)
+
+    def _simulate_equilibrium(self, callback=None):
+        """Assign the expected demand at user equilibrium under BPR congestion costs.
+
+        nt receives the equilibrium flows, and benefits are scored on the congested travel
+        times from then on.
+        """
+        nodes = self.core.nodes
+        n = len(nodes)
+        if n < 2:
+            print("Not enough nodes in the graph to start the simulation.")
+            return
+
+        self.equilibrium = EquilibriumAssignment(self.core, self.iterations * self.agent_count / (n * (n - 1)),
+                                                 capacity=self.capacity, method=self.equilibrium_method,
+                                                 demand=self.demand)
+        for step, gap in self.equilibrium.iterate():
+            self.metrics.count('equilibrium_iterations')
+            yield {"progress": 0, "total_iterations": self.iterations, "relative_gap": gap,
+                   "message": f"Equilibrium iteration {step}, relative gap {gap:.5f}"}
+        self.metrics.count('trees_reused', self.equilibrium.trees_reused)
+        self.metrics.count('trees_computed', self.equilibrium.trees_computed)
+        self.benefit_engine.set_costs(self.equilibrium.costs)
+        flows = np.rint(self.equilibrium.flows).astype(np.int64)
+        yield self._merge_chunk(0, self.iterations, flows, (0, n - 1), callback, sampled=False)
+
+    def _sample_pairs(self, trips):
+        """(starts, ends) node ids of trips agents, from the demand model or uniform."""
+        if self.demand is None:
+            return sample_pairs(self.rng, len(self.core.nodes), trips)
+        return self.demand.sample(self.rng, trips)
+
+    def _add_pair_trips(self, pairs):
+        """Add sparse (pair keys, trip counts) from pair_trip_counts to pair_trips."""
+        keys, counts = pairs
+        self.pair_trips.reshape(-1)[keys] += counts
+
+    def _routed_pair_trips(self):
+        """n x n trips routed so far per ordered node-id pair, tracked or, in analytic mode, expected."""
+        n = self.core.number_of_nodes()
+        if self.mode == 'analytic':
+            trips = self.completed_iterations * self.agent_count
+            if self.demand is None:
+                pair_trips = np.full((n, n), trips / (n * (n - 1)))
+                np.fill_diagonal(pair_trips, 0.0)
+                return pair_trips
+            return trips * np.stack([self.demand.shares_from(origin) for origin in range(n)])
+        if self.pair_trips is None:
+            raise ValueError("Trips per OD pair were not tracked; create the simulation with track_pairs=True.")
+        return self.pair_trips
+
+    def _chunks(self):
+        """(first, last) iteration ranges that batched and parallel modes route at once."""
+        size = self.batch_size or self.update_interval
+        return [(first, min(first + size, self.iterations)) for first in range(0, self.iterations, size)]
+
+    def _merge_chunk(self, first, last, loads, last_pair, callback=None, sampled=True):
+        """Add one chunk's edge loads to nt, record a snapshot and report progress."""
+        nodes = self.core.nodes
+        self.nt.array[:] += loads
+        self.completed_iterations = last
+        self.metrics.count('agents_routed', (last - first) * self.agent_count)
+        self.metrics.count('edges_incremented', int(loads.sum()))
+
+        with self.metrics.timer('snapshots'):
+            self.snapshots.maybe_record(last - 1, self.nt.array)
+        self._report(last - 1)
+        self._maybe_checkpoint()
+
+        next_update = -(-first // self.update_interval) * self.update_interval
+        if callback and next_update < last:
+            callback(currentPath=[(nodes[last_pair[0]], nodes[last_pair[1]])], trafficData=self.nt,
+                     metrics=self.metrics_summary())
+        update = {"progress": last, "total_iterations": self.iterations,
+                  "message": f"Simulating traffic, iteration {last}/{self.iterations}"}
+        if self.convergence is not None:
+            # Expected counts carry no sampling error.
+            update["error_bound"] = self._check_convergence(loads) if sampled else 0.0
+        return update
+
+    def _check_convergence(self, loads):
+        """Feed one batch of loads to the convergence monitor and return its error bound."""
+        ranking = self.top_roads(self.convergence.top_k) if self.convergence.top_k else None
+        self.convergence.update(loads, ranking)
+        return self.convergence.error_bound
+
+    def top_roads(self, k):
+        """The k best candidate roads under the current counts, best first."""
+        candidates = [road for road in self.potential_roads if road not in self.selected_roads]
+        benefits = self.score_roads(candidates)
+        return [candidates[i] for i in np.argsort(-benefits, kind='stable')[:k]]
+
+    def _maybe_checkpoint(self):
+        """Hand a copy of the state to the background writer once per checkpoint interval."""
+        if self._checkpoint_writer is not None and self.completed_iterations >= self._next_checkpoint:
+            with self.metrics.timer('checkpoint'):
+                self._checkpoint_writer.submit(*self.checkpoint_state())
+            self._next_checkpoint = self.completed_iterations + self.checkpoint_interval
+
+    def checkpoint_state(self):
+        """(arrays, meta) copy of everything needed to resume this simulation exactly."""
+        iterations, counts = self.snapshots.matrix()
+        arrays = {
+            'edge_u': self.core.edge_u.copy(),
+            'edge_v': self.core.edge_v.copy(),
+            'weights': self.core.weights.copy(),
+            'nt': self.nt.array.copy(),
+            'snapshot_iterations': iterations.copy(),
+            'snapshot_counts': counts.copy(),
+        }
+        if self.pair_trips is not None:
+            arrays['pair_trips'] = self.pair_trips.copy()
+        meta = {
+            'graph_version': self.core.version,
+            'nodes': self.core.nodes,
+            'iteration': self.completed_iterations,
+            'snapshot_interval': self.snapshots.interval,
+            'rng_state': self.rng.bit_generator.state,
+            'random_state': random.getstate(),
+            'selected_roads': self.selected_roads,
+            'initial_potential_roads': self.initial_potential_roads,
+            'road_details': list(self.road_details.values()),
+            'simulation_data': self.simulation_data,
+            'settings': {
+                'iterations': self.iterations, 'agent_count': self.agent_count,
+                'update_interval': self.update_interval, 'mode': self.mode, 'batch_size': self.batch_size,
+                'seed': self.seed, 'snapshot_capacity': self.snapshot_capacity, 'csv_export': self.csv_export,
+                'output_dir': self.output_dir, 'checkpoint_interval': self.checkpoint_interval,
+                'road_factor': self.road_factor, 'routing': self.routing, 'track_pairs': self.track_pairs,
+            },
+        }
+        return arrays, meta
+
+    def save_checkpoint(self, path):
+        """Write a checkpoint now, atomically, on the calling thread."""
+        write_checkpoint(path, *self.checkpoint_state())
+        print(f"Checkpoint saved successfully to {path}.")
+
+    @classmethod
+    def from_checkpoint(cls, path, **options):
+        """Rebuild a simulation from a checkpoint; simulate_traffic() then continues the run.
+
+        The continued run matches an uninterrupted one exactly. ``options`` override stored
+        settings such as workers or output_dir; a demand model is not stored and has to be
+        passed again.
+        """
+        arrays, meta = read_checkpoint(path)
+
+        def label(value):
+            return tuple(value) if isinstance(value, list) else value
+
+        def road(value):
+            return tuple(label(node) for node in value)
+
+        core = CompactGraph([label(node) for node in meta['nodes']],
+                            np.stack([arrays['edge_u'], arrays['edge_v']], axis=1), arrays['weights'])
+        core.version = meta['graph_version']
+        simulation = cls(core, [road(r) for r in meta['initial_potential_roads']],
+                         **{**meta['settings'], 'checkpoint_path': path, **options})
+        simulation.nt.array[:] = arrays['nt']
+        if simulation.pair_trips is not None and 'pair_trips' in arrays:
+            simulation.pair_trips[:] = arrays['pair_trips']
+        simulation.snapshots.restore(arrays['snapshot_iterations'], arrays['snapshot_counts'],
+                                     meta['snapshot_interval'])
+        simulation.selected_roads = [road(r) for r in meta['selected_roads']]
+        simulation.potential_roads = [r for r in simulation.initial_potential_roads
+                                      if r not in simulation.selected_roads]
+        for details in meta['road_details']:
+            details['road'] = road(details['road'])
+            simulation.road_details[details['road']] = details
+        simulation.simulation_data = meta['simulation_data']
+        simulation.rng.bit_generator.state = meta['rng_state']
+        version, state, gauss = meta['random_state']
+        random.setstate((version, tuple(state), gauss))
+        simulation.start_iteration = meta['iteration']
+        return simulation
+
+    def commit_road(self, road, weight):
+        """Add a new road and move the traffic it attracts onto it, without re-simulating.
+
+        Exactly the OD pairs with d(s, x) + weight + d(y, t) (or the same through y -> x)
+        below d(s, t) are rerouted: their old path loads leave nt and their new paths'
+        loads are added. Distances and the path table are updated in O(n^2) rather than
+        recomputed, so later commits start from them. Returns the number of rerouted pairs.
+        With routing='ch' the old paths are the ones the hierarchy loaded. Not available in
+        equilibrium mode.
+        """
+        if self.mode == 'equilibrium':
+            raise ValueError("Equilibrium flows depend on congestion; run simulate_traffic again after adding roads.")
+        x, y = self.core.index[road[0]], self.core.index[road[1]]
+        if self.core.edge_id(x, y) is not None:
+            raise ValueError(f"Road {road} already exists; only new roads can be committed incrementally.")
+        pair_trips = self._routed_pair_trips()
+        with self.metrics.timer('reassignment'):
+            distances = self.benefit_engine.distance_matrix()
+            if self.routing == 'ch' and self.mode != 'analytic':
+                delta, distances, rerouted = self._reassign_on_hierarchy(road, x, y, weight, distances, pair_trips)
+            else:
+                offsets, edge_ids = self.path_cache.path_table()
+                eid = self.add_road(*road, weight)
+                delta, distances, table, rerouted = reassign_new_edge(distances, offsets, edge_ids, pair_trips, x, y,
+                                                                      eid, weight, len(self.nt))
+                self.path_cache.set_path_table(table)
+            self.nt.array[:] += np.rint(delta).astype(np.int64)
+            self.benefit_engine.set_distances(distances)
+            if self.completed_iterations:
+                self.snapshots.record(self.completed_iterations - 1, self.nt.array)
+        self.metrics.count('pairs_rerouted', rerouted)
+        return rerouted
+
+    def _reassign_on_hierarchy(self, road, x, y, weight, distances, pair_trips):
+        """commit_road for hierarchy-routed traffic: (load change, updated distances, rerouted pairs).
+
+        A pair's old path is the one earlier commits moved it to, else its path in the
+        hierarchy as it was when the traffic was loaded, so ties resolve exactly as they did
+        then. New head and tail paths come from the live hierarchy before the road is added.
+        """
+        if self._loaded_router is None:
+            if self.core.version != self._loaded_version:
+                raise ValueError("Roads were added since the traffic was routed; commit_road cannot tell which paths "
+                                 "the hierarchy used.")
+            self._loaded_router = self.router.frozen()
+            self._loaded_iterations = self.completed_iterations
+        elif self.completed_iterations != self._loaded_iterations:
+            raise ValueError("Traffic was routed after roads were committed; commit_road cannot tell which paths "
+                             "the hierarchy used.")
+        n = self.core.number_of_nodes()
+        pairs, heads, tails, new_distances = improved_pairs(distances, x, y, weight)
+        trips = pair_trips.reshape(-1)[pairs]
+        moved = np.flatnonzero(trips > 0)
+        old_paths, new_paths = [], []
+        for pair, head, tail in zip(pairs[moved].tolist(), heads[moved].tolist(), tails[moved].tolist()):
+            old = self._routed_paths.get(pair)
+            if old is None:
+                start, end = divmod(pair, n)
+                old = self._loaded_router.path_ids(start, end)[1] if np.isfinite(distances[start, end]) else []
+            old_paths.append(old)
+            new_paths.append((self.router.path_ids(*divmod(head, n))[1], self.router.path_ids(*divmod(tail, n))[1]))
+
+        eid = self.add_road(*road, weight)
+        delta = np.zeros(len(self.nt), dtype=np.float64)
+        for pair, old, (head, tail), count in zip(pairs[moved].tolist(), old_paths, new_paths, trips[moved].tolist()):
+            path = head + [eid] + tail
+            self._routed_paths[pair] = path
+            delta[old] -= count
+            delta[path] += count
+        return delta, new_distances, len(pairs)
+
+    def evaluate_and_update_road_benefits(self, k=1, reassign=False):
+        """Evaluate potential roads for benefits, select and update the graph with the best k roads.
+
+        With reassign=True each new road also takes over the traffic it attracts (commit_road),
+        so the next round scores against updated counts instead of a fresh simulation.
+        """
+        candidates = [road for road in self.potential_roads if road not in self.selected_roads]
+        road_benefits = list(zip(candidates, self.score_roads(candidates).tolist()))
         road_benefits.sort(key=lambda x: x[1], reverse=True)
 
         for road, benefit in road_benefits[:k]:
-            traffic_volume = self.nt.get(road, 0) + self.nt.get((road[1], road[0]), 0)
-            proposed_weight = self.calculate_shortest_path(*road) * 0.8
-            current_weight = self.graph[road[0]][road[1]]['weight'] if self.graph.has_edge(*road) else np.nan
-            # Store each road evaluation in the DataFrame
-            self.simulation_data.append({
-                'Road': str(road),
-                'Benefit': benefit,
-                'Traffic Volume': traffic_volume,
-                'Proposed Weight': proposed_weight,
-                'Current Weight': current_weight
-            })
+            self._record_road(road, benefit)
 
         # Update selected roads based on benefits
         for i in range(min(k, len(road_benefits))):
             best_road, _ = road_benefits[i]
-            self.graph.add_edge(*best_road, weight=self.road_details[best_road]['proposed_weight'])
-            self.selected_roads.append(best_road)
+            self._select_road(best_road, reassign)
 
-        # Adjust potential_roads for the next evaluation
-        self.potential_roads = [road for road in self.initial_potential_roads if road not in self.selected_roads]
         selected_road_details = [self.road_details[road] for road in self.selected_roads[-k:]]
 
         return selected_road_details
 
-    def save_traffic_counts_to_csv(self):
-        file_path = "TrafficCounts.csv"
+    def plan_roads(self, k=1, lazy=True):
+        """Select k roads greedily, re-scoring the remaining candidates after each one is added.
 
-        with open(file_path, 'w', newline='') as csvfile:
-            fieldnames = ['iteration', 'traffic_counts']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        Equivalent to k calls of evaluate_and_update_road_benefits(k=1). With lazy=True the
+        candidates sit in a CELF priority queue of upper bounds and only those whose bound
+        could still beat the current best are re-scored, which returns the same roads.
+        """
+        # Each road is a single candidate, however often potential_roads lists it.
+        candidates = list(dict.fromkeys(road for road in self.potential_roads if road not in self.selected_roads))
+        if not lazy:
+            details = []
+            for _ in range(min(k, len(candidates))):
+                details.extend(self.evaluate_and_update_road_benefits(k=1))
+            return details
 
-            writer.writeheader()
-            for data in self.simulation_data:
-                writer.writerow({'iteration': data['iteration'], 'traffic_counts': data['traffic_counts']})
+        # nt stays fixed while planning, and roads added on the way start at zero traffic.
+        traffic = self.benefit_engine.traffic_matrix(self.nt.array)
+        touching = {}
+        for i, (x, y) in enumerate(candidates):
+            touching.setdefault(x, []).append(i)
+            touching.setdefault(y, []).append(i)
 
-        print(f"Traffic counts saved successfully to {file_path}.")
+        def score(indices):
+            roads = [candidates[i] for i in indices]
+            self.metrics.count('benefit_evaluations', len(roads))
+            with self.metrics.timer('benefit'):
+                benefits, bounds = self.benefit_engine.score_with_bounds(roads, self.nt.array, traffic)
+            return np.where(np.isnan(benefits), -np.inf, benefits), np.where(np.isnan(bounds), np.inf, bounds)
+
+        def commit(index, benefit):
+            road = candidates[index]
+            self._record_road(road, benefit)
+            self._select_road(road)
+            # New neighbors of the road's ends add neighbor pairs the old bounds never saw.
+            return touching.get(road[0], []) + touching.get(road[1], [])
 
-    def save_graph_edges_to_csv(self):
-        file_path = "GraphEdges.csv"
+        picked = lazy_greedy(len(candidates), k, score, commit)
+        return [self.road_details[candidates[index]] for index, _ in picked]
 
-        with open(file_path, 'w', newline='') as csvfile:
-            fieldnames = ['From', 'To', 'Weight']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    def _record_road(self, road, benefit):
+        """Store the evaluation details of a road about to be selected."""
+        traffic_volume = self.nt.get(road, 0) + self.nt.get((road[1], road[0]), 0)
+        # The committed road is as long as the road its benefit was scored with.
+        proposed_weight = self.calculate_shortest_path(*road) * self.road_factor
+        eid = self.core.edge_id(self.core.index[road[0]], self.core.index[road[1]])
+        current_weight = self.core.weights[eid] if eid is not None else np.nan
+        self.road_details[road] = {
+            'road': road,
+            'benefit': benefit,
+            'traffic_volume': traffic_volume,
+            'proposed_weight': proposed_weight,
+            'current_weight': current_weight
+        }
+        # Store each road evaluation in the DataFrame
+        self.simulation_data.append({
+            'Road': str(road),
+            'Benefit': benefit,
+            'Traffic Volume': traffic_volume,
+            'Proposed Weight': proposed_weight,
+            'Current Weight': current_weight
+        })
+
+    def _select_road(self, road, reassign=False):
+        """Add a recorded road to the graph and drop it from the candidates."""
+        weight = self.road_details[road]['proposed_weight']
+        if reassign and self.core.edge_id(self.core.index[road[0]], self.core.index[road[1]]) is None:
+            self.commit_road(road, weight)
+        else:
+            self.add_road(*road, weight=weight)
+        self.selected_roads.append(road)
+        self.potential_roads = [road for road in self.initial_potential_roads if road not in self.selected_roads]
+
+    def output_path(self, name):
+        """Path of an output file inside output_dir."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, name)
+
+    def save_traffic_counts(self, path=None):
+        path = path or self.output_path("TrafficCounts")
+        iterations, counts = self.snapshots.matrix()
+        save_traffic_counts(path, self.nt.edges, iterations, counts)
+
+        print(f"Traffic counts saved successfully to {path}.")
+
+    def save_traffic_counts_to_csv(self, file_path=None):
+        file_path = file_path or self.output_path("TrafficCounts.csv")
+        iterations, counts = self.snapshots.matrix()
+        save_traffic_counts_csv(file_path, self.nt.edges, iterations, counts)
+
+        print(f"Traffic counts saved successfully to {file_path}.")
 
-            writer.writeheader()
-            for u, v, attrs in self.G.edges(data=True):
-                writer.writerow({'From': u, 'To': v, 'Weight': attrs.get('weight', None)})
+    def save_graph_edges_to_csv(self, file_path=None):
+        file_path = file_path or self.output_path("GraphEdges.csv")
+        # A path without the .csv extension gets the compact binary edge list.
+        write_edge_list(file_path, self.original_core)
 
         print(f"Graph edges saved successfully to {file_path}.")
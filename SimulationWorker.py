@@ -0,0 +1,118 @@
+# SimulationWorker.py
+import multiprocessing
+import queue
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SimulationCancelled(Exception):
+    """Raised inside the worker process to abandon a cancelled run."""
+
+
+def _checkpoint(control):
+    """Block while paused; raise SimulationCancelled once the run is cancelled."""
+    running, cancelled = control
+    while not running.wait(0.1):
+        if cancelled.is_set():
+            raise SimulationCancelled()
+    if cancelled.is_set():
+        raise SimulationCancelled()
+
+
+def _run_simulation(graph, potential_roads, edges, options, shm_name, events, control):
+    """Worker process entry point: simulate and publish counts through shared memory."""
+    from SimulationLogic import TrafficSimulation
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        simulation = TrafficSimulation(graph, potential_roads, **options)
+        shared = np.ndarray((len(edges),), dtype=np.int64, buffer=shm.buf)
+        # Publish in the parent's edge order, whatever order the worker's graph copy uses.
+        slots = np.array([simulation.nt.slot(u, v) for u, v in edges], dtype=np.int64)
+
+        def publish(currentPath=None, **_):
+            shared[:] = simulation.nt.array[slots]
+            if currentPath:
+                events.put({'type': 'path', 'currentPath': currentPath})
+            _checkpoint(control)
+
+        last = None
+        for progress in simulation.simulate_traffic(callback=publish):
+            publish()
+            last = progress
+            events.put({'type': 'progress', 'progress': progress['progress'],
+                        'total_iterations': progress['total_iterations'], 'message': progress['message']})
+        shared[:] = simulation.nt.array[slots]
+        events.put({'type': 'done', 'message': last['message'] if last else '',
+                    'metrics': last.get('metrics') if last else None})
+    except SimulationCancelled:
+        events.put({'type': 'cancelled', 'message': "Simulation cancelled"})
+    except Exception as e:
+        events.put({'type': 'error', 'error': str(e), 'traceback': traceback.format_exc()})
+    finally:
+        shm.close()
+
+
+class SimulationProcess:
+    """A TrafficSimulation running in its own process.
+
+    Edge counts are published, in the order of ``edges``, to a shared-memory int64 array
+    readable through ``counts``; progress, path, completion and error events arrive on
+    a queue drained by poll(), which never blocks and is meant for a Tk ``after()`` loop.
+    """
+
+    def __init__(self, graph, potential_roads, edges, **options):
+        context = multiprocessing.get_context('spawn')
+        edges = [tuple(edge) for edge in edges]
+        self._shm = shared_memory.SharedMemory(create=True, size=max(8 * len(edges), 8))
+        self.counts = np.ndarray((len(edges),), dtype=np.int64, buffer=self._shm.buf)
+        self.counts[:] = 0
+        self.events = context.Queue()
+        self._running = context.Event()
+        self._cancelled = context.Event()
+        self._running.set()
+        self.process = context.Process(target=_run_simulation, name='traffic-simulation',
+                                       args=(graph, potential_roads, edges, options, self._shm.name, self.events,
+                                             (self._running, self._cancelled)))
+        self.process.start()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def poll(self, limit=100):
+        """Up to limit pending events, without waiting."""
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()
+
+    def close(self, timeout=5.0):
+        """Stop the worker if still running and release the shared memory."""
+        if self.process.is_alive():
+            self.cancel()
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        self.counts = None
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,116 @@
+# SnapshotStore.py
+import numpy as np
+
+
+class SnapshotStore:
+    """Bounded columnar store of cumulative edge counts sampled during a simulation.
+
+    Rows are sampled iterations and columns are edge ids. At most ``capacity`` rows are
+    kept: with ``overflow='decimate'`` every other row is dropped and the sampling interval
+    doubles, so the whole run stays covered at a coarser resolution; with ``overflow='ring'``
+    the oldest rows are overwritten.
+
+    Rows are allocated as samples arrive, doubling up to ``capacity``, and the edge columns
+    grow geometrically, so adding roads one at a time does not copy the matrix each time.
+    """
+
+    def __init__(self, edge_count, interval=500, capacity=1024, overflow='decimate'):
+        if overflow not in ('decimate', 'ring'):
+            raise ValueError(f"Unknown overflow policy {overflow!r}")
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        self.interval = interval
+        self.capacity = capacity
+        self.overflow = overflow
+        self._iterations = np.zeros(capacity, dtype=np.int64)
+        self._edge_count = edge_count
+        self._counts = np.zeros((0, edge_count), dtype=np.int64)
+        self._size = 0
+        self._start = 0  # oldest row, only moves in ring mode
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def edge_count(self):
+        return self._edge_count
+
+    def _resize(self, rows, columns):
+        counts = np.zeros((rows, columns), dtype=np.int64)
+        kept_rows, kept_columns = min(rows, len(self._counts)), min(columns, self._counts.shape[1])
+        counts[:kept_rows, :kept_columns] = self._counts[:kept_rows, :kept_columns]
+        self._counts = counts
+
+    def add_edges(self, edge_count):
+        """Widen the store to edge_count columns; new edges read as zero in earlier rows."""
+        if edge_count > self._counts.shape[1]:
+            self._resize(len(self._counts), max(edge_count, self._counts.shape[1] * 3 // 2))
+        self._edge_count = max(self._edge_count, edge_count)
+
+    def _rows(self):
+        return (self._start + np.arange(self._size)) % self.capacity
+
+    def _last_iteration(self):
+        return self._iterations[(self._start + self._size - 1) % self.capacity] if self._size else None
+
+    def maybe_record(self, iteration, counts):
+        """Record counts if at least one sampling interval passed since the last row."""
+        last = self._last_iteration()
+        if last is None or iteration - last >= self.interval:
+            self.record(iteration, counts)
+
+    def record(self, iteration, counts):
+        """Store a copy of the cumulative counts reached at iteration."""
+        if self._size and self._last_iteration() == iteration:
+            self._counts[(self._start + self._size - 1) % self.capacity, :len(counts)] = counts
+            return
+        if self._size == self.capacity:
+            if self.overflow == 'decimate':
+                keep = np.arange(0, self.capacity, 2)
+                self._iterations[:len(keep)] = self._iterations[keep]
+                self._counts[:len(keep)] = self._counts[keep]
+                self._size = len(keep)
+                self.interval *= 2
+            else:
+                self._start = (self._start + 1) % self.capacity
+                self._size -= 1
+        row = (self._start + self._size) % self.capacity
+        if row >= len(self._counts):
+            # Rows fill in order until the store is first full, so growing keeps every row in place.
+            self._resize(min(self.capacity, max(row + 1, 2 * len(self._counts))), self._counts.shape[1])
+        self._iterations[row] = iteration
+        self._counts[row] = 0
+        self._counts[row, :len(counts)] = counts
+        self._size += 1
+
+    def iterations(self):
+        """Sampled iterations, oldest first."""
+        return self._iterations[self._rows()]
+
+    def counts_at(self, iteration):
+        """Cumulative counts of the latest sample taken at or before iteration."""
+        iterations = self.iterations()
+        position = np.searchsorted(iterations, iteration, side='right') - 1
+        if position < 0:
+            raise KeyError(f"No snapshot at or before iteration {iteration}")
+        return self._counts[self._rows()[position], :self._edge_count].copy()
+
+    def series(self, edge):
+        """(iterations, cumulative counts) of edge id edge across all kept samples."""
+        rows = self._rows()
+        return self._iterations[rows], self._counts[rows, edge]
+
+    def restore(self, iterations, counts, interval):
+        """Replace every kept sample, e.g. with a checkpointed matrix() and sampling interval."""
+        self.interval = interval
+        self._start = 0
+        self._size = len(iterations)
+        self.add_edges(counts.shape[1])
+        self._iterations[:self._size] = iterations
+        self._counts = np.zeros((self._size, self._counts.shape[1]), dtype=np.int64)
+        self._counts[:, :counts.shape[1]] = counts
+
+    def matrix(self):
+        """(iterations, iteration x edge count matrix) of all kept samples, oldest first."""
+        rows = self._rows()
+        return self._iterations[rows], self._counts[rows, :self._edge_count]
@@ -0,0 +1,119 @@
+# TrafficIO.py
+import ast
+import csv
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+TrafficCountsFile = namedtuple('TrafficCountsFile', ['edges', 'iterations', 'counts'])
+
+EDGES_FILE = 'edges.npy'
+ITERATIONS_FILE = 'iterations.npy'
+COUNTS_FILE = 'counts.npy'
+
+
+def _label_array(edges):
+    """Edge endpoints as a (E, 2) array that np.save can store without pickling."""
+    labels = np.asarray(list(edges)).reshape(-1, 2)
+    if labels.dtype == object:
+        labels = labels.astype(str)
+    return labels
+
+
+def save_traffic_counts(path, edges, iterations, counts):
+    """Write an edge table and an iteration x edge count matrix as .npy files under path."""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, EDGES_FILE), _label_array(edges))
+    np.save(os.path.join(path, ITERATIONS_FILE), np.asarray(iterations, dtype=np.int64))
+    np.save(os.path.join(path, COUNTS_FILE), np.ascontiguousarray(counts, dtype=np.int64))
+
+
+def load_traffic_counts(path, mmap=True):
+    """Load a traffic count directory; the count matrix is memory-mapped unless mmap is False."""
+    mode = 'r' if mmap else None
+    return TrafficCountsFile(np.load(os.path.join(path, EDGES_FILE)),
+                             np.load(os.path.join(path, ITERATIONS_FILE)),
+                             np.load(os.path.join(path, COUNTS_FILE), mmap_mode=mode))
+
+
+def iter_count_chunks(path, rows=4096):
+    """Stream (iterations, counts) blocks of at most rows iterations from a count directory."""
+    traffic = load_traffic_counts(path, mmap=True)
+    for first in range(0, len(traffic.iterations), rows):
+        yield traffic.iterations[first:first + rows], np.asarray(traffic.counts[first:first + rows])
+
+
+def save_traffic_counts_csv(path, edges, iterations, counts):
+    """Write the legacy TrafficCounts.csv layout: one dict repr of all edge counts per row."""
+    edges = [tuple(edge) for edge in edges]
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=['iteration', 'traffic_counts'])
+        writer.writeheader()
+        for iteration, row in zip(np.asarray(iterations).tolist(), np.asarray(counts).tolist()):
+            writer.writerow({'iteration': iteration, 'traffic_counts': dict(zip(edges, row))})
+
+
+def load_traffic_counts_csv(path):
+    """Parse the legacy CSV layout into the same structure load_traffic_counts returns."""
+    iterations = []
+    rows = []
+    with open(path, mode='r', newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            iterations.append(int(row['iteration']))
+            rows.append(ast.literal_eval(row['traffic_counts']))
+
+    edges = list(dict.fromkeys(edge for counts in rows for edge in counts))
+    column = {edge: i for i, edge in enumerate(edges)}
+    counts = np.zeros((len(rows), len(edges)), dtype=np.int64)
+    for i, row in enumerate(rows):
+        for edge, count in row.items():
+            counts[i, column[edge]] = count
+    return TrafficCountsFile(_label_array(edges), np.asarray(iterations, dtype=np.int64), counts)
+
+
+def aggregate_traffic_counts(iterations, counts, window=None, max_windows=60, top_n=20):
+    """Traffic per road and iteration window from cumulative snapshot counts, for plotting.
+
+    Only the last snapshot of every window is read, so a memory-mapped count matrix is never
+    loaded whole. Windows are ``window`` iterations wide, by default wide enough for at most
+    ``max_windows`` of them. The ``top_n`` roads with the most traffic get a row each and the
+    remaining roads are summed into one last row.
+
+    Returns ``(window_ends, roads, matrix)``: the last iteration of each window, the column
+    index of every top road (busiest first) and a (rows, windows) matrix of the traffic that
+    passed during each window.
+    """
+    iterations = np.asarray(iterations, dtype=np.int64)
+    if not len(iterations):
+        return iterations, np.zeros(0, dtype=np.int64), np.zeros((0, 0))
+    if window is None:
+        window = max(1, -(-int(iterations[-1] + 1) // max_windows))
+    bins = iterations // window
+    ends = np.flatnonzero(np.r_[bins[1:] != bins[:-1], True])
+
+    cumulative = np.asarray(counts[ends], dtype=np.float64)
+    volume = np.diff(cumulative, axis=0, prepend=np.zeros((1, cumulative.shape[1])))
+    roads = np.argsort(-cumulative[-1], kind='stable')[:top_n]
+    matrix = volume[:, roads].T
+    if len(roads) < cumulative.shape[1]:
+        other = volume.sum(axis=1) - matrix.sum(axis=0)
+        matrix = np.vstack([matrix, other])
+    return iterations[ends], roads, matrix
+
+
+def road_details_json(details):
+    """JSON-safe copy of a selected road's details: the road as a list, other values as floats.
+
+    Values JSON has no number for (NaN, e.g. the current weight of a new road, and
+    infinities) become None.
+    """
+    record = {}
+    for key, value in details.items():
+        if key == 'road':
+            record[key] = list(value)
+        else:
+            value = float(value)
+            record[key] = value if math.isfinite(value) else None
+    return record
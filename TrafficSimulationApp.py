@@ -1,23 +1,28 @@
 import tkinter as tk
-import traceback
-from threading import Thread
 from tkinter import messagebox, Toplevel, ttk
-import matplotlib.pyplot as plt
 import networkx as nx
-import numpy as np
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from CandidateRoads import top_candidate_roads
+from CompactGraph import CompactGraph
+from GraphLayout import LayoutService
+from GraphRenderer import GraphRenderer
 from SimulationLogic import TrafficSimulation
+from SimulationWorker import SimulationProcess
+
+# How often the Tk mainloop drains worker events and redraws.
+POLL_INTERVAL_MS = 50
 
 
 class TrafficSimulationApp:
-    def __init__(self, master, graph, potential_roads):
+    def __init__(self, master, graph, potential_roads, use_network=False):
         super().__init__()
 
         self.master = master
-        # Graph initializations
+        # Graph initializations; the small demo network is shown unless use_network is set.
         self.graph = graph
         self.potential_roads = potential_roads
-        self.pos = nx.spring_layout(self.graph)
+        self.use_network = use_network
+        # Node positions are cached on disk by edge list and shared with post-processing.
+        self.layout = LayoutService()
 
         self.G = None  # Graph
         self.potentialRoads = None
@@ -25,24 +30,27 @@ class TrafficSimulationApp:
         self.fig = None
         self.canvas = None
         self.progress_label = None
-        self.simulation_thread_lambda = None
         self.run_button = None
+        self.pause_button = None
+        self.cancel_button = None
         self.leaderboardWindow = None
         self.ax = None
+        self.renderer = None
         self.canvas_widget = None
         self.data_button = None
         self.visualize_button = None
-
-        self.prepare_simulation()
+        self.worker = None
+        self.base_counts = None
+        # Extra TrafficSimulation keyword arguments for the worker process.
+        self.simulation_options = {}
 
         # Initialize UI components
         self.configure_main_window()
         self.setup_simulation_graph()
-        self.setupUI()
 
         # Simulation Initializations
-        self.simulation = TrafficSimulation(self.G, potential_roads)
-        self.simulationThread = Thread(target=self.runSimulation, daemon=True)  # Initialize the thread here
+        self.simulation = TrafficSimulation(self.G, self.potentialRoads)
+        self.setupUI()
         self.simulationActive = False
         self.currentPath = []
 
@@ -53,6 +61,12 @@ class TrafficSimulationApp:
         self.master.configure(bg='dark slate gray')
 
     def setup_simulation_graph(self):
+        if self.use_network:
+            # A loaded road network (networkx or CompactGraph) is simulated as is.
+            self.G = self.graph.to_networkx() if isinstance(self.graph, CompactGraph) else self.graph
+            self.potentialRoads = list(self.potential_roads)
+            self.pos = self.layout.positions(self.G)
+            return
         # Initialize the graph with nodes and edges
         self.G = nx.Graph()
         self.G.add_edges_from([
@@ -60,23 +74,99 @@ class TrafficSimulationApp:
             (1, 3, {'weight': 11}), (2, 4, {'weight': 10}),
             (3, 4, {'weight': 7})
         ])
-        self.potentialRoads = [(0, 2), (0, 3), (1, 2), (1, 4), (2, 3)]
-        self.pos = nx.spring_layout(self.G)
+        self.potentialRoads = top_candidate_roads(self.G, max_hops=self.G.number_of_nodes())
+        self.pos = self.layout.positions(self.G)
 
     def setupUI(self):
         """Set up the user interface components."""
         self.setup_canvas()
         self.setup_buttons()
-        self.updateGraphVisualization(currentPath=None)
+        self.renderer = GraphRenderer(self.ax, self.canvas, self.pos, self.simulation.nt.edges, self.potentialRoads)
+        self.updateGraphVisualization(currentPath=None, force=True)
 
     def start_simulation(self):
-        if not self.simulationActive:
-            self.simulationActive = True
-            self.run_button.config(state='disabled', text="Simulation Running")
-            Thread(target=self.simulation_thread_lambda).start()
+        """Run the simulation in a worker process and poll it from the Tk mainloop."""
+        if self.simulationActive:
+            return
+        if len(self.G.nodes) < 2:
+            messagebox.showinfo("Simulation Error", "Not enough nodes in the graph to start the simulation.")
+            return
+        self.simulationActive = True
+        self.run_button.config(state='disabled', text="Simulation Running")
+        self.pause_button.config(state='normal', text="Pause")
+        self.cancel_button.config(state='normal')
+        # Worker counts start at zero and are shown on top of the counts of earlier runs.
+        self.base_counts = self.simulation.nt.array.copy()
+        self.worker = SimulationProcess(self.simulation.graph, self.simulation.potential_roads,
+                                        self.simulation.nt.edges, **self.simulation_options)
+        self.master.after(POLL_INTERVAL_MS, self.poll_simulation)
+
+    def toggle_pause(self):
+        if self.worker is None:
+            return
+        if self.worker.paused:
+            self.worker.resume()
+            self.pause_button.config(text="Pause")
+        else:
+            self.worker.pause()
+            self.pause_button.config(text="Resume")
+
+    def cancel_simulation(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
+    def poll_simulation(self):
+        """Drain worker events, mirror the shared counts and redraw; reschedules itself."""
+        if self.worker is None:
+            return
+        for event in self.worker.poll():
+            kind = event['type']
+            if kind == 'progress':
+                print(event['message'])
+            elif kind == 'path':
+                self.currentPath = event['currentPath']
+            elif kind == 'error':
+                print(event['traceback'])
+                self.stop_worker()
+                messagebox.showerror("Error", event['error'])
+                return
+            elif kind == 'cancelled':
+                print(event['message'])
+                self.stop_worker()
+                return
+            elif kind == 'done':
+                print(event['message'])
+                self.sync_counts()
+                self.stop_worker()
+                self.finalizeSimulation()
+                return
+
+        if not self.worker.is_alive() and self.worker.events.empty():
+            self.stop_worker()
+            messagebox.showerror("Error", "The simulation process exited unexpectedly.")
+            return
+        self.sync_counts()
+        self.updateGraphVisualization(currentPath=self.currentPath)
+        self.master.after(POLL_INTERVAL_MS, self.poll_simulation)
+
+    def sync_counts(self):
+        """Copy the worker's published counts into the local simulation's nt."""
+        self.simulation.nt.array[:] = self.base_counts + self.worker.counts
+
+    def stop_worker(self):
+        self.worker.close()
+        self.worker = None
+        self.simulationActive = False
+        self.run_button.config(state='normal', text="Start Simulation")
+        self.pause_button.config(state='disabled', text="Pause")
+        self.cancel_button.config(state='disabled')
 
     def setup_canvas(self):
         """Set up the canvas for graph visualization."""
+        # Plotting libraries are only needed once a window exists
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         self.fig, self.ax = plt.subplots(figsize=(8, 6))
         self.ax.axis('off')
 
@@ -91,66 +181,28 @@ class TrafficSimulationApp:
         self.run_button = ttk.Button(self.master, text="Start Simulation", command=self.start_simulation,
                                      style='TButton')
         self.run_button.pack(side=tk.BOTTOM, pady=20)
+        self.pause_button = ttk.Button(self.master, text="Pause", command=self.toggle_pause, style='TButton',
+                                       state='disabled')
+        self.pause_button.pack(side=tk.BOTTOM, pady=5)
+        self.cancel_button = ttk.Button(self.master, text="Cancel", command=self.cancel_simulation, style='TButton',
+                                        state='disabled')
+        self.cancel_button.pack(side=tk.BOTTOM, pady=5)
 
     def highlight_path(self, source, target):
-        path = nx.dijkstra_path(self.G, source, target, weight='weight')
-        path_edges = list(zip(path, path[1:]))
-        nx.draw_networkx_nodes(self.G, self.pos, nodelist=path, node_color='r')
-        nx.draw_networkx_edges(self.G, self.pos, edgelist=path_edges, edge_color='r', width=2)
-        self.canvas.draw()
-
-    def updateGraphVisualization(self, currentPath=None):
-        self.simulation = None
-        self.ax.clear()
-        # Basic graph drawing
-        nx.draw(self.G, self.pos, with_labels=True, node_color='skyblue', edge_color='k', ax=self.ax, node_size=500)
-
-        # Drawing potential roads with a distinct style
-        nx.draw_networkx_edges(self.G, self.pos, edgelist=self.potentialRoads, edge_color='green', style='dashed',
-                               ax=self.ax)
-
-        # Highlighting the current path
+        self.renderer.update(path=self.simulation.router.path(source, target), force=True)
+
+    def updateGraphVisualization(self, currentPath=None, force=False):
+        """Restyle the persistent graph artists with the current traffic and path."""
+        # Frames past the renderer's rate cap are dropped before any path is looked up.
+        if not force and not self.renderer.frame_due():
+            return
+        if len(self.renderer.edges) != len(self.simulation.nt):
+            self.renderer.set_edges(self.simulation.nt.edges)
+        path = None
         if currentPath:
-            nx.draw_networkx_edges(self.G, self.pos, edgelist=[currentPath], edge_color='darkblack', width=3,
-                                   ax=self.ax)
-
-        # Visualizing traffic density as a heatmap
-        if self.simulation and hasattr(self.simulation, 'nt'):
-            for edge, traffic in self.simulation.nt.items():
-                intensity = np.log1p(traffic) / np.log1p(max(self.simulation.nt.values()))
-                nx.draw_networkx_edges(self.G, self.pos, edgelist=[edge], width=2, edge_color=[(1, 0, 0, intensity)],
-                                       ax=self.ax)
-            else:
-                pass
-
-        self.canvas.draw()
-
-    def prepare_simulation(self):
-        """Prepares and returns a simulation instance, along with a thread to run it."""
-        self.simulation = TrafficSimulation(self.graph, self.potential_roads)
-        self.simulation_thread_lambda = lambda: self.runSimulation()
-
-    def runSimulation(self):
-        if len(self.G.nodes) < 2:
-            messagebox.showinfo("Simulation Error", "Not enough nodes in the graph to start the simulation.")
-            exit()
-        if not self.simulation:
-            self.simulation = TrafficSimulation(self.G, self.potentialRoads)  # Initialize the simulation
-
-        try:
-            for progress in self.simulation.simulate_traffic():
-                if not self.simulationActive:  # Check for pause state
-                    break
-                print(progress['message'])
-                if 'error' in progress:
-                    messagebox.showerror("Error", progress['error'])
-                    break
-        except Exception as e:
-            traceback.print_exc()
-            messagebox.showerror("Error", str(e))
-        finally:
-            if self.simulationActive:  # If still active, finalize the simulation
-                self.finalizeSimulation()
+            source, target = currentPath[0]
+            path = self.simulation.router.path(source, target)
+        self.renderer.update(counts=self.simulation.nt.array, path=path, force=force)
 
     def export_graph_structure(self):
         """Export the graph structure as a list of edges for post-processing."""
@@ -163,9 +215,9 @@ class TrafficSimulationApp:
             # Assuming bidirectional traffic, sum both directions
             traffic_volume = self.simulation.nt.get(road, 0) + self.simulation.nt.get((road[1], road[0]), 0)
             detail['traffic_volume'] = traffic_volume
-        self.updateGraphVisualization(currentPath=None)
-        self.simulationActive = False
-        self.run_button.config(state='normal', text="Start Simulation")
+        self.pos = self.layout.update(self.simulation.graph, self.pos)
+        self.renderer.pos = self.pos
+        self.updateGraphVisualization(currentPath=None, force=True)
 
     def displayBenefitMatrix(self):
         # This is a placeholder
@@ -175,6 +227,7 @@ class TrafficSimulationApp:
     def on_closing(self):
         if self.simulationActive:
             if messagebox.askyesno("Confirm Exit", "Simulation is running. Are you sure you want to exit?"):
+                self.stop_worker()
                 self.master.destroy()
         else:
             self.master.destroy()
@@ -1,18 +1,34 @@
 # main.py
-import tkinter as tk
-from TrafficSimulationApp import TrafficSimulationApp
-from LargerNetwork import initialize_graph
+import argparse
+import sys
 
+from LargerNetwork import initialize_graph, load_network
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the traffic simulation GUI.")
+    parser.add_argument('--graph', default=None,
+                        help="Simulate this road network: a From,To,Weight CSV or a binary edge list.")
+    args = parser.parse_args(argv)
+
+    import tkinter as tk
+    from TrafficSimulationApp import TrafficSimulationApp
 
-def main():
     root = tk.Tk()
     root.configure(bg='dark slate gray')
 
-    graph, potential_roads = initialize_graph(nodes=60, k=3)
-    app = TrafficSimulationApp(root, graph, potential_roads)
+    if args.graph:
+        graph, potential_roads = load_network(args.graph)
+    else:
+        graph, potential_roads = initialize_graph(nodes=60, k=3)
+    app = TrafficSimulationApp(root, graph, potential_roads, use_network=args.graph is not None)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
+    if '--headless' in sys.argv[1:]:
+        from HeadlessRunner import main as headless_main
+        headless_main([arg for arg in sys.argv[1:] if arg != '--headless'])
+    else:
+        main(sys.argv[1:])